@@ -1,9 +1,12 @@
 """
 API route handlers
 """
-from fastapi import APIRouter, HTTPException, Query, Path
-from typing import List
-from datetime import timedelta
+import asyncio
+import secrets
+from fastapi import APIRouter, Header, HTTPException, Query, Path, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Dict, List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.schemas.prediction import (
     PredictionRequest,
@@ -12,22 +15,124 @@ from app.schemas.prediction import (
     HealthResponse,
     ModelInfoResponse,
     AnalyticsResponse,
-    ForecastResponse
+    ForecastResponse,
+    GridForecastResponse,
+    CacheStatsResponse,
+    ModelListResponse,
+    RegisteredModel,
+    ReloadResponse
 )
-from app.services.prediction_service import prediction_service
-from app.models.model_loader import model_manager
+from app.core.executor import prediction_executor, ExecutorBusyError
+from app.core.cache import prediction_cache
+from app.core.metrics import metrics
+from app.core.profiler import profiler, ProfilerBusyError
+from app.core.startup import startup_state
 from app.core.config import (
     MIN_STORE_ID,
     MAX_STORE_ID,
     MIN_ITEM_ID,
     MAX_ITEM_ID,
     MAX_FORECAST_DAYS,
-    MAX_BATCH_SIZE
+    MAX_BATCH_SIZE,
+    PREDICTION_RETRY_AFTER_SECONDS,
+    ADMIN_TOKEN,
+    PROFILE_MAX_SECONDS,
+    MODEL_PATHS,
+    COMPILED_MODEL_PATHS,
+    USE_COMPILED_MODEL,
+    SCALER_PATH,
+    SCALED_MODELS,
+    DATA_PATH,
+    COLUMNAR_DATA_PATH,
+    MATERIALIZE_FORECASTS
 )
-from datetime import datetime
+from datetime import datetime, timedelta
 
 router = APIRouter()
 
+# Response header naming the model/data version a response was computed with
+VERSION_HEADER = "X-Model-Version"
+
+
+def require_services():
+    """
+    Prediction service and model manager, imported on first use
+    
+    The model stack (pandas, numpy, joblib) is imported by the background
+    startup task, so until it finishes these endpoints answer 503.
+    """
+    if startup_state.loading:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is starting ({startup_state.stage}), please retry shortly",
+            headers={"Retry-After": str(PREDICTION_RETRY_AFTER_SECONDS)}
+        )
+    from app.services.prediction_service import prediction_service
+    from app.models.model_loader import model_manager
+    return prediction_service, model_manager
+
+
+def pin_state(response: Response):
+    """
+    Prediction service and the serving state to use for this whole request
+    
+    A hot reload swaps in a new state without affecting requests that already
+    pinned the previous one; the response header reports which version answered.
+    """
+    prediction_service, model_manager = require_services()
+    state = model_manager.state
+    response.headers[VERSION_HEADER] = str(state.version)
+    return prediction_service, state
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound service code on the prediction executor, 503 when it is saturated"""
+    try:
+        return await prediction_executor.run(func, *args, **kwargs)
+    except ExecutorBusyError:
+        raise HTTPException(
+            status_code=503,
+            detail="Prediction queue is full, please retry shortly",
+            headers={"Retry-After": str(PREDICTION_RETRY_AFTER_SECONDS)}
+        )
+
+
+def require_admin(x_admin_token: Optional[str]) -> None:
+    """404 while ADMIN_TOKEN is unset, 403 unless the X-Admin-Token header matches it"""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def parse_ensemble(ensemble: Optional[str]) -> Optional[Dict[str, float]]:
+    """Parse "name:weight,name:weight" ensemble query strings"""
+    if not ensemble:
+        return None
+    try:
+        return {
+            name.strip(): float(weight)
+            for name, weight in (member.split(":") for member in ensemble.split(","))
+        }
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid ensemble. Use name:weight pairs, e.g. xgboost:0.7,lightgbm:0.3"
+        )
+
+
+def parse_ids(value: Optional[str], low: int, high: int, name: str) -> List[int]:
+    """Parse comma-separated IDs within [low, high]; all of them when omitted"""
+    if not value:
+        return list(range(low, high + 1))
+    try:
+        ids = sorted({int(part) for part in value.split(",")})
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} list. Use comma-separated IDs, e.g. 1,2,3")
+    if ids[0] < low or ids[-1] > high:
+        raise HTTPException(status_code=400, detail=f"{name} IDs must be between {low} and {high}")
+    return ids
+
 
 @router.get("/", tags=["General"])
 async def root():
@@ -43,18 +148,59 @@ async def root():
 
 @router.get("/health", response_model=HealthResponse, tags=["General"])
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint: liveness, readiness and startup progress"""
+    version = 0
+    if startup_state.loading:
+        model_loaded, data_loaded = startup_state.model_loaded, startup_state.data_loaded
+    else:
+        _, model_manager = require_services()
+        state = model_manager.state
+        model_loaded = state.model is not None
+        data_loaded = state.snapshot is not None
+        version = state.version
+    
+    ready = model_loaded and data_loaded
+    if ready:
+        status = "healthy"
+    elif startup_state.loading:
+        status = "starting"
+    else:
+        status = "degraded"
+    
     return HealthResponse(
-        status="healthy",
-        model_loaded=model_manager.model is not None,
-        data_loaded=model_manager.data is not None,
+        status=status,
+        live=True,
+        ready=ready,
+        stage=startup_state.stage,
+        model_loaded=model_loaded,
+        data_loaded=data_loaded,
+        startup_timings=startup_state.timings,
+        version=version,
         timestamp=datetime.now().isoformat()
     )
 
 
+@router.get("/health/live", tags=["General"])
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", tags=["General"])
+async def readiness():
+    """Readiness probe: 200 once the model and data are loaded, 503 before"""
+    if startup_state.loading:
+        return JSONResponse(status_code=503, content={"status": "starting", "stage": startup_state.stage})
+    _, model_manager = require_services()
+    if not model_manager.is_ready():
+        return JSONResponse(status_code=503, content={"status": "not_ready", "stage": startup_state.stage})
+    return {"status": "ready"}
+
+
 @router.get("/model", response_model=ModelInfoResponse, tags=["Model"])
 async def get_model_info():
     """Get XGBoost model information and performance metrics"""
+    _, model_manager = require_services()
     return ModelInfoResponse(
         name="xgboost",
         type="XGBoost Regressor",
@@ -66,6 +212,43 @@ async def get_model_info():
     )
 
 
+@router.get("/models", response_model=ModelListResponse, tags=["Model"])
+async def list_models(response: Response):
+    """Models that can be selected per request or combined in an ensemble"""
+    _, state = pin_state(response)
+    registry = state.registry
+    return ModelListResponse(
+        default=registry.default,
+        models=[
+            RegisteredModel(name=name, source=scorer.source, default=name == registry.default)
+            for name, scorer in registry.scorers.items()
+        ]
+    )
+
+
+@router.get("/cache", response_model=CacheStatsResponse, tags=["Model"])
+async def get_cache_stats():
+    """Prediction cache size, hit rate and eviction counters"""
+    _, model_manager = require_services()
+    return CacheStatsResponse(
+        version=model_manager.version,
+        **prediction_cache.stats()
+    )
+
+
+@router.get("/metrics", tags=["Model"], response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: request counts, errors and latencies per endpoint,
+    per-stage prediction timings, batch sizes and prediction cache lookups
+    
+    Enabled with METRICS_ENABLED=true.
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 @router.get("/stores", tags=["Data"])
 async def list_stores():
     """List all available stores"""
@@ -85,7 +268,7 @@ async def list_items():
 
 
 @router.post("/predict", response_model=PredictionResponse, tags=["Predictions"])
-async def predict_inventory(request: PredictionRequest):
+async def predict_inventory(request: PredictionRequest, response: Response):
     """
     Make a single inventory prediction
     
@@ -94,11 +277,16 @@ async def predict_inventory(request: PredictionRequest):
     - Recommended inventory (sales + safety stock)
     - Confidence intervals (95%)
     """
+    prediction_service, state = pin_state(response)
     try:
-        result = prediction_service.predict_sales(
+        result = await run_blocking(
+            prediction_service.predict_sales,
             store=request.store,
             item=request.item,
-            date=request.date
+            date=request.date,
+            model=request.model,
+            weights=request.ensemble,
+            state=state
         )
         
         return PredictionResponse(
@@ -107,14 +295,16 @@ async def predict_inventory(request: PredictionRequest):
             date=request.date,
             **result
         )
+    except HTTPException:
+        raise
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=getattr(e, "status_code", 404), detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
 @router.post("/batch-predict", response_model=List[PredictionResponse], tags=["Predictions"])
-async def batch_predict(request: BatchPredictionRequest):
+async def batch_predict(request: BatchPredictionRequest, response: Response):
     """Make batch predictions for multiple store-item-date combinations"""
     if len(request.predictions) > MAX_BATCH_SIZE:
         raise HTTPException(
@@ -122,48 +312,176 @@ async def batch_predict(request: BatchPredictionRequest):
             detail=f"Batch size too large. Maximum {MAX_BATCH_SIZE} predictions per request."
         )
     
+    metrics.observe_batch("/batch-predict", len(request.predictions))
+    prediction_service, state = pin_state(response)
+    try:
+        batch_results = await run_blocking(
+            prediction_service.predict_batch,
+            [(pred_req.store, pred_req.item, pred_req.date) for pred_req in request.predictions],
+            [(pred_req.model, pred_req.ensemble) for pred_req in request.predictions],
+            state
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=getattr(e, "status_code", 404), detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+    
+    # Plain dicts, validated once against the response model
     results = []
-    for pred_req in request.predictions:
-        try:
-            result = await predict_inventory(pred_req)
-            results.append(result)
-        except Exception as e:
-            print(f"Error in batch prediction: {e}")
+    for pred_req, result in zip(request.predictions, batch_results):
+        if result is None:
+            print(f"Error in batch prediction: No historical data for store {pred_req.store}, item {pred_req.item}")
             continue
+        result.update(store=pred_req.store, item=pred_req.item, date=pred_req.date)
+        results.append(result)
     
     return results
 
 
+@router.post("/batch-predict/stream", tags=["Predictions"])
+async def batch_predict_stream(request: Request):
+    """
+    Stream predictions for any number of rows
+    
+    The body is NDJSON, one prediction request object per line (as for /predict),
+    and may be sent chunked. Results stream back as NDJSON in input order, one
+    line per input line: the prediction, or {"line": n, "error": ...} for rows
+    that are invalid or have no history.
+    """
+    _, model_manager = require_services()
+    from app.services.batch_stream import prediction_streamer
+    
+    state = model_manager.state
+    if not state.is_ready():
+        raise HTTPException(status_code=503, detail="Model or data not loaded")
+    
+    body = await prediction_streamer.spool(request.stream())
+    return StreamingResponse(
+        prediction_streamer.stream(body, state),
+        media_type="application/x-ndjson",
+        headers={VERSION_HEADER: str(state.version)}
+    )
+
+
 @router.get("/analytics/{store}/{item}", response_model=AnalyticsResponse, tags=["Analytics"])
 async def get_analytics(
+    response: Response,
     store: int = Path(..., ge=MIN_STORE_ID, le=MAX_STORE_ID),
     item: int = Path(..., ge=MIN_ITEM_ID, le=MAX_ITEM_ID),
     days: int = Query(90, ge=1, le=365, description="Number of days of history")
 ):
     """Get historical analytics for a store-item combination"""
+    prediction_service, state = pin_state(response)
     try:
-        result = prediction_service.get_analytics(store, item, days)
+        result = await run_blocking(prediction_service.get_analytics, store, item, days, state)
         
         return AnalyticsResponse(
             store=store,
             item=item,
             **result
         )
+    except HTTPException:
+        raise
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=getattr(e, "status_code", 404), detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analytics failed: {str(e)}")
 
 
+@router.get("/forecast/grid", response_model=GridForecastResponse, tags=["Predictions"])
+async def forecast_grid(
+    response: Response,
+    stores: str = Query(None, description="Comma-separated store IDs (default: all stores)"),
+    items: str = Query(None, description="Comma-separated item IDs (default: all items)"),
+    start_date: str = Query(None, description="First forecast date, YYYY-MM-DD (default: day after the data ends)"),
+    end_date: str = Query(None, description="Last forecast date, YYYY-MM-DD (default: from days)"),
+    days: int = Query(7, ge=1, le=MAX_FORECAST_DAYS, description="Number of days to forecast if end_date is omitted"),
+    model: str = Query(None, description="Model to use: xgboost, lightgbm or ridge (default: xgboost)"),
+    ensemble: str = Query(None, description="Weighted ensemble instead of one model, e.g. xgboost:0.7,lightgbm:0.3"),
+    method: str = Query("recursive", pattern="^(recursive|direct)$", description=(
+        "recursive: each day builds on the previous days' predictions, as /forecast does; "
+        "direct: each day is predicted from the history alone, as /predict does"
+    ))
+):
+    """
+    Forecast a whole grid of stores × items over a date range
+    
+    All series are scored together and returned as matrices (one row per
+    series, one column per date) instead of nested prediction objects.
+    """
+    prediction_service, state = pin_state(response)
+    if model and ensemble:
+        raise HTTPException(status_code=400, detail="Use either model or ensemble, not both")
+    weights = parse_ensemble(ensemble)
+    store_ids = parse_ids(stores, MIN_STORE_ID, MAX_STORE_ID, "store")
+    item_ids = parse_ids(items, MIN_ITEM_ID, MAX_ITEM_ID, "item")
+    if state.snapshot is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    
+    try:
+        first_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else (
+            state.snapshot.max_date + timedelta(days=1)
+        )
+        if end_date:
+            days = (datetime.strptime(end_date, '%Y-%m-%d') - first_date).days + 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range must cover 1 to {MAX_FORECAST_DAYS} days"
+        )
+    
+    try:
+        grid = await run_blocking(
+            prediction_service.forecast_grid,
+            store_ids,
+            item_ids,
+            first_date,
+            days,
+            model,
+            weights,
+            method == "recursive",
+            state
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=getattr(e, "status_code", 404), detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Grid forecast failed: {str(e)}")
+    
+    return GridForecastResponse(
+        method=method,
+        dates=grid['dates'],
+        series=[list(key) for key in grid['series']],
+        missing=[list(key) for key in grid['missing']],
+        predicted_sales=grid['predicted_sales'].tolist(),
+        recommended_inventory=grid['recommended_inventory'].tolist(),
+        confidence_lower=grid['confidence_lower'].tolist(),
+        confidence_upper=grid['confidence_upper'].tolist()
+    )
+
+
 @router.get("/forecast/{store}/{item}", response_model=ForecastResponse, tags=["Predictions"])
 async def forecast_next_days(
+    response: Response,
     store: int = Path(..., ge=MIN_STORE_ID, le=MAX_STORE_ID),
     item: int = Path(..., ge=MIN_ITEM_ID, le=MAX_ITEM_ID),
     days: int = Query(7, ge=1, le=MAX_FORECAST_DAYS, description="Number of days to forecast"),
-    start_date: str = Query(None, description="Start date for forecast (YYYY-MM-DD)")
+    start_date: str = Query(None, description="Start date for forecast (YYYY-MM-DD)"),
+    model: str = Query(None, description="Model to use: xgboost, lightgbm or ridge (default: xgboost)"),
+    ensemble: str = Query(None, description="Weighted ensemble instead of one model, e.g. xgboost:0.7,lightgbm:0.3")
 ):
     """Forecast sales for the next N days starting from a specific date"""
-    if model_manager.data is None:
+    prediction_service, state = pin_state(response)
+    if model and ensemble:
+        raise HTTPException(status_code=400, detail="Use either model or ensemble, not both")
+    weights = parse_ensemble(ensemble)
+    snapshot = state.snapshot
+    if snapshot is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
     
     # Use provided start_date or default to last date in data
@@ -174,25 +492,24 @@ async def forecast_next_days(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     else:
-        base_date = model_manager.data['date'].max()
+        base_date = snapshot.max_date
     
-    # Generate predictions for next N days
-    predictions = []
-    for i in range(1, days + 1):
-        forecast_date = (base_date + timedelta(days=i)).strftime('%Y-%m-%d')
-        
-        request = PredictionRequest(
-            store=store,
-            item=item,
-            date=forecast_date
+    # Recursively forecast the next N days
+    try:
+        forecast = await run_blocking(
+            prediction_service.forecast_sales, store, item, base_date, days, model, weights, state
         )
-        
-        try:
-            pred = await predict_inventory(request)
-            predictions.append(pred)
-        except Exception as e:
-            print(f"Forecast error for {forecast_date}: {e}")
-            continue
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=getattr(e, "status_code", 404), detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Forecast failed: {str(e)}")
+    
+    predictions = [
+        PredictionResponse(store=store, item=item, **result)
+        for result in forecast
+    ]
     
     return ForecastResponse(
         store=store,
@@ -200,3 +517,82 @@ async def forecast_next_days(
         forecast_days=days,
         predictions=predictions
     )
+
+
+@router.post("/admin/reload", response_model=ReloadResponse, tags=["Admin"])
+async def reload_models(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reload the models and data from disk without downtime
+    
+    Everything is loaded next to what is being served and swapped in at once;
+    requests already running finish on the previous version. Requires the
+    X-Admin-Token header to match ADMIN_TOKEN (the endpoint is disabled without it).
+    """
+    require_admin(x_admin_token)
+    
+    _, model_manager = require_services()
+    from app.models.model_loader import ReloadInProgressError
+    from app.services.forecast_table import forecast_materializer
+    
+    previous_version = model_manager.version
+    loop = asyncio.get_running_loop()
+    try:
+        # Compiled exports already have the scaler folded in
+        result = await loop.run_in_executor(None, lambda: model_manager.reload(
+            COMPILED_MODEL_PATHS if USE_COMPILED_MODEL else MODEL_PATHS,
+            COLUMNAR_DATA_PATH if COLUMNAR_DATA_PATH.exists() else DATA_PATH,
+            scaled_models=() if USE_COMPILED_MODEL else SCALED_MODELS,
+            scaler_path=SCALER_PATH,
+            prepare=forecast_materializer.refresh if MATERIALIZE_FORECASTS else None
+        ))
+    except ReloadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving version {previous_version}: {str(e)}")
+    
+    return ReloadResponse(status="reloaded", previous_version=previous_version, **result)
+
+
+@router.post("/admin/profile", tags=["Admin"], response_class=Response)
+async def capture_profile(
+    seconds: float = Query(10, gt=0, description="How long to profile, or the time limit with every"),
+    every: Optional[int] = Query(None, ge=1, description="Profile every Kth request instead of all threads"),
+    requests: int = Query(10, ge=1, description="Requests to profile with every"),
+    format: str = Query("pstats", pattern="^(pstats|collapsed)$", description=(
+        "pstats (pstats.Stats, snakeviz) or collapsed stacks (flamegraph.pl, speedscope)"
+    )),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Capture a CPU profile of the API and download it
+    
+    Samples the Python stack of every thread for `seconds`, or with `every`,
+    only the prediction work of every Kth request until `requests` of them
+    finished. Requires PROFILING_ENABLED=true and the X-Admin-Token header.
+    """
+    require_admin(x_admin_token)
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {PROFILE_MAX_SECONDS:g}")
+    
+    try:
+        if every is None:
+            profile = await profiler.capture(seconds)
+        else:
+            profile = await profiler.capture_requests(every, requests, timeout=seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    content, extension = (profile.pstats(), "pstats") if format == "pstats" else (profile.collapsed(), "folded")
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(
+        content=content,
+        media_type="application/octet-stream" if format == "pstats" else "text/plain",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(profile.samples),
+            "X-Profile-Requests": str(profile.requests),
+            "X-Profile-Seconds": f"{profile.seconds:.3f}",
+        }
+    )
@@ -11,12 +11,34 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 MODEL_DIR = BASE_DIR / "models"
 MODEL_FILE = "xgboost_model.pkl"
 MODEL_PATH = MODEL_DIR / MODEL_FILE
+FEATURE_NAMES_PATH = MODEL_DIR / "feature_names.pkl"  # Column order used in training
+
+# Prediction-only exports of the models below (models/*.npz), scored with
+# NumPy alone (create them with src.model_utils.export_compiled_model)
+USE_COMPILED_MODEL = os.getenv("USE_COMPILED_MODEL", "false").lower() == "true"
+
+# Model registry: every model can be selected per request or combined in an
+# ensemble. Only the linear model was trained on standardized features.
+DEFAULT_MODEL = "xgboost"
+MODEL_PATHS = {
+    "xgboost": MODEL_PATH,
+    "lightgbm": MODEL_DIR / "lightgbm_model.pkl",
+    "ridge": MODEL_DIR / "ridge_model.pkl",
+}
+COMPILED_MODEL_PATHS = {name: path.with_suffix(".npz") for name, path in MODEL_PATHS.items()}
+SCALER_PATH = MODEL_DIR / "scaler.pkl"
+SCALED_MODELS = ("ridge",)
+ENSEMBLE_WORKERS = int(os.getenv("ENSEMBLE_WORKERS", len(MODEL_PATHS)))
 
 # Data settings
 DATA_DIR = BASE_DIR / "data" / "processed"
 DATA_FILE = "processed_kaggle_sales_data.csv"
 DATA_PATH = DATA_DIR / DATA_FILE
 
+# Memory-mapped columnar copy of the data, preferred at startup when present
+# (create it with: python -m app.models.columnar_store)
+COLUMNAR_DATA_PATH = DATA_DIR / "sales_columnar"
+
 # API settings
 API_TITLE = "Inventory Prediction API"
 API_DESCRIPTION = "XGBoost-based ML API for retail inventory demand forecasting"
@@ -50,6 +72,41 @@ MAX_ITEM_ID = 50
 MAX_FORECAST_DAYS = 30
 MAX_BATCH_SIZE = 100
 
+# Streaming batch predictions (POST /batch-predict/stream) have no size limit;
+# rows are scored STREAM_CHUNK_SIZE at a time
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1000))
+STREAM_MAX_LINE_BYTES = 64 * 1024
+STREAM_SPOOL_BYTES = 1024 * 1024  # Request bodies beyond this are buffered on disk
+
+# Precompute the next MAX_FORECAST_DAYS days for every series in the background,
+# rebuilt whenever the model or data version changes (opt-in)
+MATERIALIZE_FORECASTS = os.getenv("MATERIALIZE_FORECASTS", "false").lower() == "true"
+FORECAST_REFRESH_INTERVAL_SECONDS = float(os.getenv("FORECAST_REFRESH_INTERVAL_SECONDS", 5))
+
+# Prediction executor (CPU-bound work runs off the event loop)
+PREDICTION_WORKERS = int(os.getenv("PREDICTION_WORKERS", min(4, os.cpu_count() or 1)))
+PREDICTION_QUEUE_LIMIT = int(os.getenv("PREDICTION_QUEUE_LIMIT", 32))  # running + waiting tasks
+PREDICTION_RETRY_AFTER_SECONDS = int(os.getenv("PREDICTION_RETRY_AFTER_SECONDS", 1))
+
+# Prediction cache (cleared whenever the model or data is reloaded; 0 entries disables it)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", 300))
+
+# Admin endpoints (POST /admin/reload) need this token in the X-Admin-Token
+# header; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# Prometheus metrics on GET /metrics: request counts and latencies, per-stage
+# prediction timings, batch sizes and cache hits (no overhead while disabled)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+# On-demand CPU profiling (POST /admin/profile, which also needs ADMIN_TOKEN).
+# Captures sample thread stacks every PROFILE_SAMPLE_INTERVAL_SECONDS; while
+# disabled nothing is installed and requests pay nothing
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_SECONDS", 0.005))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+
 # Feature engineering parameters
 LAG_PERIODS = [1, 3, 7, 14, 30, 60, 90]
 ROLLING_WINDOWS = [7, 14, 30, 60, 90]
@@ -0,0 +1,73 @@
+"""
+Bounded executor for CPU-bound prediction work
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.core.config import PREDICTION_WORKERS, PREDICTION_QUEUE_LIMIT
+from app.core.profiler import profiler
+
+
+class ExecutorBusyError(Exception):
+    """Raised when the executor already holds its maximum number of tasks"""
+
+
+class BoundedExecutor:
+    """Thread pool that rejects work instead of queueing it without limit"""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of tasks running or waiting for a worker"""
+        return self._pending
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function on the pool without blocking the event loop"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorBusyError(f"{self._pending} prediction tasks already pending")
+            self._pending += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="prediction"
+                )
+            pool = self._pool
+
+        # Release the slot when the work actually finishes, even if the caller goes away
+        try:
+            task = partial(func, *args, **kwargs)
+            if profiler.enabled:
+                task = profiler.bind(task)
+            future = pool.submit(task)
+        except BaseException:
+            self._release(None)  # Never submitted (e.g. the pool was shut down)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        """Stop the worker threads"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global prediction executor instance
+prediction_executor = BoundedExecutor(
+    max_workers=PREDICTION_WORKERS,
+    max_pending=PREDICTION_QUEUE_LIMIT
+)
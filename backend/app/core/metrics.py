@@ -0,0 +1,137 @@
+"""
+Request and per-stage latency metrics, exposed in the Prometheus text format
+"""
+import time
+from contextlib import nullcontext
+from typing import Dict
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.core.cache import prediction_cache
+from app.core.config import METRICS_ENABLED
+
+
+# Seconds: prediction stages take microseconds to milliseconds, requests up to seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 1000, 2500, 10000, 100000)
+
+_disabled = nullcontext()
+
+
+class CacheCollector:
+    """Reads the prediction cache counters at scrape time, so lookups pay nothing extra"""
+
+    def collect(self):
+        stats = prediction_cache.stats()
+        lookups = CounterMetricFamily(
+            'inventory_prediction_cache_lookups', 'Prediction cache lookups by result', labels=['result']
+        )
+        lookups.add_metric(['hit'], stats['hits'])
+        lookups.add_metric(['miss'], stats['misses'])
+        yield lookups
+        yield CounterMetricFamily(
+            'inventory_prediction_cache_evictions', 'Prediction cache entries evicted', value=stats['evictions']
+        )
+        yield GaugeMetricFamily(
+            'inventory_prediction_cache_entries', 'Prediction cache entries', value=stats['entries']
+        )
+
+
+class Metrics:
+    """
+    Request counters and latency histograms, per endpoint and per prediction stage
+
+    While disabled, stage() returns a shared no-op context manager and the
+    other hooks return at once, so instrumented code pays one attribute
+    check. The HTTP middleware is only installed when enabled.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.registry = CollectorRegistry()
+        self.requests = Counter(
+            'inventory_requests', 'HTTP requests', ['endpoint', 'method', 'status'], registry=self.registry
+        )
+        self.errors = Counter(
+            'inventory_errors', 'HTTP responses with a 4xx or 5xx status', ['endpoint', 'status'],
+            registry=self.registry
+        )
+        self.request_latency = Histogram(
+            'inventory_request_duration_seconds', 'Time from request to the end of the response',
+            ['endpoint'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.stage_latency = Histogram(
+            'inventory_stage_duration_seconds', 'Time spent in each prediction stage',
+            ['stage'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.batch_sizes = Histogram(
+            'inventory_batch_size', 'Rows per batch prediction request',
+            ['endpoint'], buckets=BATCH_SIZE_BUCKETS, registry=self.registry
+        )
+        self.registry.register(CacheCollector())
+        self._stages: Dict[str, Histogram] = {}
+
+    def stage(self, name: str):
+        """Context manager timing one prediction stage"""
+        if not self.enabled:
+            return _disabled
+        child = self._stages.get(name)
+        if child is None:
+            child = self._stages[name] = self.stage_latency.labels(stage=name)
+        return child.time()
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float) -> None:
+        self.requests.labels(endpoint=endpoint, method=method, status=str(status)).inc()
+        self.request_latency.labels(endpoint=endpoint).observe(seconds)
+        if status >= 400:
+            self.errors.labels(endpoint=endpoint, status=str(status)).inc()
+
+    def observe_batch(self, endpoint: str, size: int) -> None:
+        if self.enabled:
+            self.batch_sizes.labels(endpoint=endpoint).observe(size)
+
+    def render(self) -> bytes:
+        """Every metric in the Prometheus text exposition format"""
+        return generate_latest(self.registry)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing every HTTP request by route template
+
+    Timing covers the whole response, including streamed bodies. Requests
+    that match no route share one label, so unknown paths cannot grow the
+    number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            metrics.observe_request(
+                getattr(route, "path", "unmatched"), scope["method"], status, time.perf_counter() - start
+            )
+
+
+# Global metrics instance
+metrics = Metrics(enabled=METRICS_ENABLED)
@@ -0,0 +1,290 @@
+"""
+On-demand CPU profiling by stack sampling, for POST /admin/profile
+"""
+import asyncio
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import PROFILING_ENABLED, PROFILE_SAMPLE_INTERVAL_SECONDS
+
+
+# (file, first line, function): how pstats identifies a function
+Function = Tuple[str, int, str]
+
+# Innermost frames of threads blocked waiting for work; those samples are dropped
+IDLE_FUNCTIONS = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+
+class ProfiledRequest:
+    """A request picked for a request profile, and whether it ran any executor work"""
+
+    __slots__ = ('profile', 'bound')
+
+    def __init__(self, profile: 'Profile'):
+        self.profile = profile
+        self.bound = False
+
+
+# Set while a request picked for profiling runs; passed on to its executor tasks
+_profiled_request: ContextVar[Optional[ProfiledRequest]] = ContextVar('profiled_request', default=None)
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is being captured"""
+
+
+class Profile:
+    """Sampled call stacks, exported as a pstats file or as collapsed stacks"""
+
+    def __init__(self):
+        self.stacks: Dict[Tuple[Function, ...], List] = {}  # root-to-leaf stack -> [samples, seconds]
+        self.samples = 0
+        self.requests = 0
+        self.seconds = 0.0
+
+    def add(self, stack: Tuple[Function, ...], seconds: float) -> None:
+        entry = self.stacks.get(stack)
+        if entry is None:
+            entry = self.stacks[stack] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        self.samples += 1
+
+    def pstats(self) -> bytes:
+        """
+        Marshalled stats in the format of cProfile's dump_stats
+
+        Loads with pstats.Stats, snakeviz or gprof2dot. Call counts are
+        sample counts and times are sampled wall time of the running thread.
+        """
+        stats: Dict[Function, List] = {}
+
+        def entry(function: Function) -> List:
+            if function not in stats:
+                stats[function] = [0, 0, 0.0, 0.0, {}]
+            return stats[function]
+
+        for stack, (samples, seconds) in self.stacks.items():
+            entry(stack[-1])[2] += seconds
+            seen = set()
+            for depth, function in enumerate(stack):
+                if function in seen:  # Recursive calls count once towards cumulative time
+                    continue
+                seen.add(function)
+                stat = entry(function)
+                stat[0] += samples
+                stat[1] += samples
+                stat[3] += seconds
+                if depth:
+                    caller = stat[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += samples
+                    caller[1] += samples
+                    caller[2] += seconds if depth == len(stack) - 1 else 0.0
+                    caller[3] += seconds
+
+        return marshal.dumps({
+            function: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for function, (cc, nc, tt, ct, callers) in stats.items()
+        })
+
+    def collapsed(self) -> bytes:
+        """One "frame;frame;frame samples" line per stack, for flamegraph.pl, speedscope or inferno"""
+        lines = [
+            ";".join(f"{name} ({_short_path(path)}:{line})" for path, line, name in stack) + f" {samples}"
+            for stack, (samples, _) in sorted(self.stacks.items(), key=lambda item: -item[1][0])
+        ]
+        return ("\n".join(lines) + "\n").encode()
+
+
+def _short_path(path: str) -> str:
+    """Path from the package root, e.g. pandas/core/frame.py or app/services/feature_engineering.py"""
+    for marker in ('site-packages' + os.sep, os.sep + 'backend' + os.sep):
+        index = path.rfind(marker)
+        if index >= 0:
+            return path[index + len(marker):]
+    return path
+
+
+def _stack(frame) -> Optional[Tuple[Function, ...]]:
+    """Root-to-leaf stack of a frame, None when the thread is idle"""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+        return None
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of the server's threads from a background thread
+
+    A profile covers either every thread for a number of seconds, or every
+    Kth request: then only the executor threads running work for the
+    picked requests are sampled (feature engineering and model inference),
+    so concurrent requests do not blur the profile. Nothing runs between
+    captures, and while disabled the middleware is not installed.
+    """
+
+    def __init__(self, enabled: bool, interval: float):
+        self.enabled = enabled
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profile: Optional[Profile] = None
+        self._threads: Optional[Counter] = None  # Thread id -> profiled tasks running; None samples every thread
+        self._every = 0
+        self._seen = 0
+        self._remaining = 0
+        self._active = 0
+        self._requests_done: Optional[asyncio.Event] = None
+
+    def _sample(self, profile: Profile, stop: threading.Event) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            with self._lock:
+                threads = None if self._threads is None else {ident for ident, n in self._threads.items() if n}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (threads is not None and ident not in threads):
+                    continue
+                stack = _stack(frame)
+                if stack is not None:
+                    profile.add(stack, elapsed)
+
+    async def _capture(self, wait: Callable, threads: Optional[Counter]) -> Profile:
+        if self._profile is not None:
+            raise ProfilerBusyError("A profile is already being captured")
+        profile = self._profile = Profile()
+        self._threads = threads
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(profile, stop), name="profiler", daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await wait()
+        finally:
+            stop.set()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+            profile.seconds = time.perf_counter() - start
+            self._every = 0
+            self._requests_done = None
+            self._threads = None
+            self._profile = None
+        return profile
+
+    async def capture(self, seconds: float) -> Profile:
+        """Profile every thread for a number of seconds"""
+        return await self._capture(lambda: asyncio.sleep(seconds), threads=None)
+
+    async def capture_requests(self, every: int, requests: int, timeout: float) -> Profile:
+        """Profile every `every`th request until `requests` have finished or `timeout` seconds pass"""
+        done = asyncio.Event()
+
+        async def wait():
+            self._requests_done = done
+            self._seen = 0
+            self._remaining = requests
+            self._active = 0
+            self._every = every
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return await self._capture(wait, threads=Counter())
+
+    def pick_request(self) -> Optional[ProfiledRequest]:
+        """
+        The request starting now, if it is profiled (called on the event loop)
+
+        Requests in flight hold the remaining slots until they finish, so no
+        more are picked than still needed.
+        """
+        if not self._every or self._remaining <= self._active:
+            return None
+        self._seen += 1
+        if self._seen % self._every:
+            return None
+        self._active += 1
+        return ProfiledRequest(self._profile)
+
+    def finish_request(self, request: ProfiledRequest) -> None:
+        """
+        Count a picked request once it finished
+
+        Only requests that ran executor work use up a slot; one rejected
+        with 503, or answered from the cache, frees its slot for the next pick.
+        """
+        if request.profile is not self._profile:
+            return  # Picked by an earlier capture
+        self._active -= 1
+        if request.bound and self._remaining > 0:
+            self._remaining -= 1
+            self._profile.requests += 1
+        if self._remaining <= 0 and self._active <= 0 and self._requests_done is not None:
+            self._requests_done.set()
+
+    def bind(self, task: Callable) -> Callable:
+        """Wrap executor work submitted by a profiled request so its thread is sampled"""
+        request = _profiled_request.get()
+        if request is None:
+            return task
+        with self._lock:
+            threads = self._threads
+        if threads is None or request.profile is not self._profile:
+            return task
+        request.bound = True
+
+        def profiled():
+            ident = threading.get_ident()
+            with self._lock:
+                threads[ident] += 1
+            try:
+                return task()
+            finally:
+                with self._lock:
+                    threads[ident] -= 1
+
+        return profiled
+
+
+class ProfilerMiddleware:
+    """ASGI middleware marking the requests a request profile picks"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        request = None
+        if scope["type"] == "http" and not scope["path"].startswith("/admin"):
+            request = profiler.pick_request()
+        if request is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = _profiled_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _profiled_request.reset(token)
+            profiler.finish_request(request)
+
+
+# Global profiler instance
+profiler = SamplingProfiler(enabled=PROFILING_ENABLED, interval=PROFILE_SAMPLE_INTERVAL_SECONDS)
@@ -0,0 +1,58 @@
+"""
+Startup progress, reported by the health endpoints while the model and data load
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StartupState:
+    """Current startup stage, per-stage timings and what has been loaded so far"""
+    
+    LOADING_STAGES = ("loading", "imports", "model", "data")
+    
+    def __init__(self):
+        self.stage = "pending"  # Until startup_event begins loading
+        self.timings: Dict[str, float] = {}
+        self.model_loaded = False
+        self.data_loaded = False
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+    
+    @property
+    def loading(self) -> bool:
+        """True while the background load is still running"""
+        return self.stage in self.LOADING_STAGES
+    
+    @property
+    def ready(self) -> bool:
+        """True once the model and data are both loaded"""
+        return self.stage == "ready"
+    
+    def begin(self) -> None:
+        self._started = time.perf_counter()
+        self.stage = "loading"
+    
+    @contextmanager
+    def timed(self, stage: str):
+        """Enter a stage and record how long it took"""
+        self.stage = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = round(time.perf_counter() - start, 3)
+            print(f"  ⏱ {stage}: {self.timings[stage]:.2f}s")
+    
+    def finish(self) -> None:
+        self.timings["total"] = round(time.perf_counter() - self._started, 3)
+        self.stage = "ready" if self.model_loaded and self.data_loaded else "degraded"
+    
+    def fail(self, error: Exception) -> None:
+        self.timings["total"] = round(time.perf_counter() - self._started, 3)
+        self.error = str(error)
+        self.stage = "failed"
+
+
+# Global startup state instance
+startup_state = StartupState()
@@ -1,6 +1,7 @@
 """
 FastAPI Application - Main Entry Point
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -10,11 +11,22 @@ from app.core.config import (
     API_VERSION,
     CORS_ORIGINS,
     CORS_ORIGIN_REGEX,
-    MODEL_PATH,
-    DATA_PATH
+    DEFAULT_MODEL,
+    MODEL_PATHS,
+    COMPILED_MODEL_PATHS,
+    USE_COMPILED_MODEL,
+    SCALER_PATH,
+    SCALED_MODELS,
+    DATA_PATH,
+    COLUMNAR_DATA_PATH,
+    MATERIALIZE_FORECASTS,
+    FORECAST_REFRESH_INTERVAL_SECONDS
 )
 from app.api.routes import router
-from app.models.model_loader import model_manager
+from app.core.executor import prediction_executor
+from app.core.startup import startup_state
+from app.core.metrics import metrics, MetricsMiddleware
+from app.core.profiler import profiler, ProfilerMiddleware
 
 
 # Initialize FastAPI app
@@ -35,35 +47,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count and time every request (only when metrics are enabled, so it costs nothing otherwise)
+if metrics.enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Mark requests for POST /admin/profile?every=K (only when profiling is enabled)
+if profiler.enabled:
+    app.add_middleware(ProfilerMiddleware)
+
 # Include API routes
 app.include_router(router)
 
 
 # ==================== Startup & Shutdown ====================
 
-@app.on_event("startup")
-async def startup_event():
-    """Load model and data on startup"""
-    print("=" * 60)
-    print("Starting Inventory Prediction API...")
-    print("=" * 60)
-    
-    # Load XGBoost model
-    print("\n[1/2] Loading XGBoost model...")
-    model_loaded = model_manager.load_model(MODEL_PATH)
+def load_resources():
+    """
+    Import the model stack and load model and data, timing each stage
     
-    # Load processed data
-    print("\n[2/2] Loading processed data...")
-    data_loaded = model_manager.load_data(DATA_PATH)
+    Runs in a worker thread so the event loop keeps answering liveness checks.
+    """
+    try:
+        with startup_state.timed("imports"):
+            # pandas, numpy, joblib and the services are only needed from here on
+            from app.models.model_loader import model_manager
+            import app.services.prediction_service  # noqa: F401
+        
+        # Load models (compiled exports already have the scaler folded in)
+        print("\n[1/2] Loading models...")
+        with startup_state.timed("model"):
+            if USE_COMPILED_MODEL:
+                loaded = model_manager.load_models(COMPILED_MODEL_PATHS)
+            else:
+                loaded = model_manager.load_models(MODEL_PATHS, SCALED_MODELS, SCALER_PATH)
+            startup_state.model_loaded = loaded.get(DEFAULT_MODEL, False)
+        
+        # Load processed data
+        print("\n[2/2] Loading processed data...")
+        with startup_state.timed("data"):
+            startup_state.data_loaded = model_manager.load_data(
+                COLUMNAR_DATA_PATH if COLUMNAR_DATA_PATH.exists() else DATA_PATH
+            )
+    except Exception as e:
+        startup_state.fail(e)
+        print(f"✗ Startup failed: {e}")
+        return
     
+    startup_state.finish()
     print("\n" + "=" * 60)
-    if model_loaded and data_loaded:
-        print("✓ API Ready!")
+    if startup_state.ready:
+        print(f"✓ API Ready! ({startup_state.timings['total']:.2f}s)")
     else:
         print("⚠ API started with warnings (check logs above)")
+    print("=" * 60 + "\n")
+
+
+async def load_in_background():
+    """Load everything off the event loop, then keep the forecast table fresh"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, load_resources)
+    
+    # Materialize forecasts in the background so startup is not delayed
+    if MATERIALIZE_FORECASTS and startup_state.stage != "failed":
+        from app.services.forecast_table import forecast_materializer
+        await forecast_materializer.watch(FORECAST_REFRESH_INTERVAL_SECONDS)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start loading model and data; /health answers liveness right away"""
+    print("=" * 60)
+    print("Starting Inventory Prediction API...")
     print("=" * 60)
     print(f"📖 API Documentation: http://localhost:8000/docs")
-    print("=" * 60 + "\n")
+    print("=" * 60)
+    
+    startup_state.begin()
+    app.state.startup_task = asyncio.create_task(load_in_background())
 
 
 @app.on_event("shutdown")
@@ -72,3 +132,7 @@ async def shutdown_event():
     print("\n" + "=" * 60)
     print("Shutting down API...")
     print("=" * 60)
+    startup_task = getattr(app.state, "startup_task", None)
+    if startup_task is not None:
+        startup_task.cancel()
+    prediction_executor.shutdown()
@@ -0,0 +1,109 @@
+"""
+Precomputed store, item and store-item sales statistics
+"""
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+from app.models.series_index import find_keys, pair_keys
+
+
+class AggregateTable:
+    """Summary statistics keyed by store, item and (store, item), built once per data load"""
+
+    def __init__(
+        self,
+        store_stats: Dict[int, Tuple[float, float, float]],
+        item_stats: Dict[int, Tuple[float, float, float]],
+        store_item_stats: Dict[Tuple[int, int], Tuple[float, float]]
+    ):
+        self.store_stats = store_stats
+        self.item_stats = item_stats
+        self.store_item_stats = store_item_stats
+
+        # The same statistics as arrays sorted by key, for looking up many rows at once
+        self._store_keys, self._store_rows = self._to_arrays(store_stats, 3)
+        self._item_keys, self._item_rows = self._to_arrays(item_stats, 3)
+        self._store_item_keys, self._store_item_rows = self._to_arrays(store_item_stats, 2)
+
+    @staticmethod
+    def _to_arrays(stats: Dict, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted int64 keys ((store, item) pairs as pair_keys) and their stats as rows"""
+        keys = [pair_keys(*key) if isinstance(key, tuple) else key for key in stats]
+        keys = np.array(keys, dtype=np.int64)
+        rows = np.array(list(stats.values()), dtype=np.float64).reshape(-1, width)
+        order = np.argsort(keys)
+        return keys[order], rows[order]
+
+    @staticmethod
+    def _lookup(keys: np.ndarray, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        positions, found = find_keys(keys, queries)
+        if not found.all():
+            raise KeyError(int(queries[np.argmin(found)]))
+        return rows[positions]
+
+    @staticmethod
+    def _to_dict(stats: pd.DataFrame) -> Dict:
+        """Convert a grouped stats frame to {key: tuple of floats}"""
+        keys = [
+            tuple(int(k) for k in key) if isinstance(key, tuple) else int(key)
+            for key in stats.index
+        ]
+        values = [tuple(float(v) for v in row) for row in stats.to_numpy()]
+        return dict(zip(keys, values))
+
+    @classmethod
+    def from_columns(
+        cls,
+        stores: np.ndarray,
+        items: np.ndarray,
+        sales: np.ndarray
+    ) -> "AggregateTable":
+        """Compute all aggregates in one grouped pass per key"""
+        sales = pd.Series(sales)
+        return cls(
+            store_stats=cls._to_dict(sales.groupby(stores).agg(['mean', 'std', 'median'])),
+            item_stats=cls._to_dict(sales.groupby(items).agg(['mean', 'std', 'median'])),
+            store_item_stats=cls._to_dict(sales.groupby([stores, items]).agg(['mean', 'std']))
+        )
+
+    def to_records(self) -> Dict[str, list]:
+        """Serialize to JSON-friendly rows of [key..., stat...]"""
+        return {
+            'store': [[key, *stats] for key, stats in self.store_stats.items()],
+            'item': [[key, *stats] for key, stats in self.item_stats.items()],
+            'store_item': [[*key, *stats] for key, stats in self.store_item_stats.items()],
+        }
+
+    @classmethod
+    def from_records(cls, records: Dict[str, list]) -> "AggregateTable":
+        """Rebuild a table serialized with to_records"""
+        return cls(
+            store_stats={int(row[0]): tuple(row[1:]) for row in records['store']},
+            item_stats={int(row[0]): tuple(row[1:]) for row in records['item']},
+            store_item_stats={(int(row[0]), int(row[1])): tuple(row[2:]) for row in records['store_item']}
+        )
+
+    def store(self, store: int) -> Tuple[float, float, float]:
+        """(mean, std, median) of sales for a store"""
+        return self.store_stats[store]
+
+    def item(self, item: int) -> Tuple[float, float, float]:
+        """(mean, std, median) of sales for an item"""
+        return self.item_stats[item]
+
+    def store_item(self, store: int, item: int) -> Tuple[float, float]:
+        """(mean, std) of sales for a store-item combination"""
+        return self.store_item_stats[(store, item)]
+
+    def stores(self, stores: np.ndarray) -> np.ndarray:
+        """(mean, std, median) rows of sales for many stores"""
+        return self._lookup(self._store_keys, self._store_rows, np.asarray(stores, dtype=np.int64))
+
+    def items(self, items: np.ndarray) -> np.ndarray:
+        """(mean, std, median) rows of sales for many items"""
+        return self._lookup(self._item_keys, self._item_rows, np.asarray(items, dtype=np.int64))
+
+    def store_items(self, stores: np.ndarray, items: np.ndarray) -> np.ndarray:
+        """(mean, std) rows of sales for many store-item combinations"""
+        return self._lookup(self._store_item_keys, self._store_item_rows, pair_keys(stores, items))
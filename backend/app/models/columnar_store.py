@@ -0,0 +1,107 @@
+"""
+Typed, memory-mappable columnar copy of the sales data
+
+The bundle is a directory with one .npy file per column plus meta.json:
+int8 store, int8 item, int32 day (days since 1970-01-01) and int16 sales,
+sorted by (store, item, day). The store/item aggregate table is stored
+alongside in aggregates.json. Loading maps the files read-only, so startup
+does not parse anything and every worker process shares the same pages.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+from app.models.aggregates import AggregateTable
+from app.models.schema import SALES_SCHEMA, COLUMNAR_FORMAT_VERSION, apply_schema
+from app.models.series_index import day_number
+
+
+FORMAT_VERSION = COLUMNAR_FORMAT_VERSION
+
+
+def convert_csv_to_columnar(csv_path: Path, out_dir: Path) -> int:
+    """
+    Convert the processed sales CSV into a columnar bundle
+    
+    Returns:
+        Number of records written
+    """
+    data = pd.read_csv(csv_path, usecols=['date', 'store', 'item', 'sales'])
+    columns = apply_schema({
+        'store': data['store'].to_numpy(),
+        'item': data['item'].to_numpy(),
+        'day': day_number(pd.to_datetime(data['date']).to_numpy()),
+        'sales': data['sales'].to_numpy(),
+    }, SALES_SCHEMA)
+    
+    # Pre-sort so the series index can use the mapped arrays without copying
+    order = np.lexsort((columns['day'], columns['item'], columns['store']))
+    
+    # Write next to the target and rename, so readers never see a partial bundle
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for name, values in columns.items():
+        np.save(tmp_dir / f"{name}.npy", values[order])
+    
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'records': int(len(order)),
+        'columns': {name: np.dtype(dtype).name for name, dtype in SALES_SCHEMA.items()},
+        'sorted_by': ['store', 'item', 'day'],
+        'source': str(csv_path),
+    }
+    (tmp_dir / 'meta.json').write_text(json.dumps(meta, indent=2))
+    
+    aggregates = AggregateTable.from_columns(columns['store'], columns['item'], columns['sales'])
+    (tmp_dir / 'aggregates.json').write_text(json.dumps(aggregates.to_records()))
+    
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return meta['records']
+
+
+def load_columnar(bundle_dir: Path) -> Dict[str, np.ndarray]:
+    """Memory-map a columnar bundle read-only"""
+    bundle_dir = Path(bundle_dir)
+    meta = json.loads((bundle_dir / 'meta.json').read_text())
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version: {meta.get('format_version')}")
+    
+    # Integer columns may be wider than SALES_SCHEMA (e.g. synthetic data
+    # with more stores or items), as long as meta.json says so
+    columns = {}
+    for name in SALES_SCHEMA:
+        values = np.load(bundle_dir / f"{name}.npy", mmap_mode='r')
+        if (
+            values.dtype.name != meta['columns'].get(name)
+            or values.dtype.kind != 'i'
+            or len(values) != meta['records']
+        ):
+            raise ValueError(f"Column '{name}' does not match meta.json")
+        columns[name] = values
+    return columns
+
+
+def load_columnar_aggregates(bundle_dir: Path) -> Optional[AggregateTable]:
+    """Load the aggregate table stored with a bundle, if there is one"""
+    path = Path(bundle_dir) / 'aggregates.json'
+    if not path.exists():
+        return None
+    return AggregateTable.from_records(json.loads(path.read_text()))
+
+
+if __name__ == "__main__":
+    import sys
+    from app.core.config import DATA_PATH, COLUMNAR_DATA_PATH
+    
+    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_PATH
+    out_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else COLUMNAR_DATA_PATH
+    records = convert_csv_to_columnar(csv_path, out_dir)
+    print(f"✓ Wrote {records} records to {out_dir}")
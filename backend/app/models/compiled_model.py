@@ -0,0 +1,88 @@
+"""
+Prediction-only models exported by src.model_utils.export_compiled_model
+
+Tree ensembles are flat node arrays walked level by level for every row and
+tree at once; linear models are a single weight vector. Scoring needs NumPy
+only, so the API process never imports xgboost, lightgbm or scikit-learn.
+"""
+import json
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Union
+import numpy as np
+
+
+COMPILED_FORMAT_VERSION = 1
+
+# How a tree node routes missing values
+MISSING_AS_ZERO = 0     # Treat NaN as 0.0 and compare (LightGBM missing_type None)
+MISSING_OR_ZERO = 1     # NaN and 0.0 take the default branch (LightGBM missing_type Zero)
+MISSING_DEFAULT = 2     # NaN takes the default branch (XGBoost, LightGBM missing_type NaN)
+
+
+class CompiledModel:
+    """Vectorized NumPy scorer for a compiled tree ensemble or linear model"""
+    
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.meta = meta
+        self.source: str = meta['source']
+        self.feature_names: List[str] = list(meta.get('feature_names', []))
+        self.input_dtype = np.dtype(meta['input_dtype'])
+        self.is_linear = 'weights' in arrays
+        
+        if self.is_linear:
+            self.weights = arrays['weights']
+            self.intercept = float(arrays['intercept'][0])
+            return
+        
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold'].astype(self.input_dtype)
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.default_left = arrays['default_left']
+        self.roots = arrays['roots']
+        self.value = arrays['value']
+        self.base_score = float(meta['base_score'])
+        self.max_depth = int(meta['max_depth'])
+        self.inclusive = meta['decision'] == 'le'
+        
+        # Per-node missing-value routing, precomputed as flags
+        missing = arrays['missing']
+        self.nan_as_zero = missing == MISSING_AS_ZERO
+        self.zero_is_missing = missing == MISSING_OR_ZERO
+        self.uses_nan_as_zero = bool(self.nan_as_zero.any())
+        self.uses_zero_as_missing = bool(self.zero_is_missing.any())
+    
+    @classmethod
+    def load(cls, path: Union[Path, BinaryIO]) -> "CompiledModel":
+        """Load a compiled .npz model from a path or an open file"""
+        with np.load(path, allow_pickle=False) as bundle:
+            meta = json.loads(str(bundle['meta']))
+            if meta.get('format_version') != COMPILED_FORMAT_VERSION:
+                raise ValueError(f"Unsupported compiled model version: {meta.get('format_version')}")
+            arrays = {name: bundle[name] for name in bundle.files if name != 'meta'}
+        return cls(arrays, meta)
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Score a feature matrix in training column order"""
+        X = np.asarray(X, dtype=self.input_dtype)
+        if self.is_linear:
+            return X @ self.weights + self.intercept
+        
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+        
+        # Every tree advances one level per step; leaves point to themselves
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            is_nan = np.isnan(x)
+            if self.uses_nan_as_zero:
+                x = np.where(is_nan & self.nan_as_zero[node], 0.0, x)
+                is_nan &= ~self.nan_as_zero[node]
+            go_left = x <= self.threshold[node] if self.inclusive else x < self.threshold[node]
+            use_default = is_nan
+            if self.uses_zero_as_missing:
+                use_default = use_default | (self.zero_is_missing[node] & (x == 0.0))
+            go_left = np.where(use_default, self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+        
+        return self.base_score + self.value[node].sum(axis=1)
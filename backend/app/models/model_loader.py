@@ -1,59 +1,362 @@
 """
 Model loading and management
 """
-import joblib
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 
+from app.models.series_index import SeriesIndex, day_number
+from app.models.aggregates import AggregateTable
+from app.models.columnar_store import load_columnar, load_columnar_aggregates
+from app.models.model_registry import ModelRegistry, load_scorer
+from app.models.schema import SALES_SCHEMA, apply_schema, columns_nbytes
+from app.core.cache import prediction_cache
+from app.core.metrics import metrics
+from app.core.config import FEATURE_NAMES_PATH, DEFAULT_MODEL, ENSEMBLE_WORKERS
+from app.services.feature_engineering import FEATURE_ORDER, FEATURE_SPEC
+
+
+class DataSnapshot:
+    """Sales history with its derived index and aggregates, swapped in as one unit"""
+    
+    def __init__(self, columns: Dict[str, np.ndarray], aggregates: Optional[AggregateTable] = None):
+        self.records = len(columns['day'])
+        self.max_date = pd.Timestamp(np.datetime64(int(columns['day'].max()), 'D'))
+        self.series_index = SeriesIndex.from_columns(
+            columns['store'], columns['item'], columns['day'], columns['sales']
+        )
+        if aggregates is None:
+            aggregates = AggregateTable.from_columns(columns['store'], columns['item'], columns['sales'])
+        self.aggregates = aggregates
+
+
+class ReloadInProgressError(RuntimeError):
+    """Raised when a reload is requested while another one is still running"""
+
+
+_local = threading.local()  # Per-thread single-row feature buffers
+
+
+def _row_buffer(dtype: np.dtype) -> np.ndarray:
+    """Preallocated (1, n_features) buffer of the given dtype, owned by the calling thread"""
+    buffers = getattr(_local, 'rows', None)
+    if buffers is None:
+        buffers = _local.rows = {}
+    buffer = buffers.get(dtype)
+    if buffer is None:
+        buffer = buffers[dtype] = np.empty((1, len(FEATURE_ORDER)), dtype=dtype)
+    return buffer
+
+
+class ServingState:
+    """
+    Models, data and the version they are served under, never modified once published
+    
+    A request reads ModelManager.state once and uses it throughout, so a reload
+    that publishes a new state meanwhile cannot mix old and new models or data
+    within one response.
+    """
+    
+    def __init__(self, registry: ModelRegistry, snapshot: Optional[DataSnapshot], version: int):
+        self.registry = registry
+        self.snapshot = snapshot
+        self.version = version
+    
+    @property
+    def model(self):
+        """Scorer of the default model, or None before it is loaded"""
+        return self.registry.get()
+    
+    def is_ready(self) -> bool:
+        """Check if model and data are loaded"""
+        return self.model is not None and self.snapshot is not None
+    
+    def predict(
+        self,
+        features: Union[pd.DataFrame, np.ndarray],
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> float:
+        """
+        Make prediction for one row of features in FEATURE_ORDER
+        
+        Args:
+            model: Registered model to use (default: DEFAULT_MODEL)
+            weights: Weighted ensemble of registered models, instead of `model`
+        """
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        
+        members = self.registry.resolve(model, weights)
+        buffer = _row_buffer(self.registry.input_dtype(members))
+        buffer[:] = features
+        with metrics.stage("model_predict"):
+            prediction = self.registry.predict(buffer, members)[0]
+        return max(0, float(prediction))  # Ensure non-negative
+    
+    def predict_batch(
+        self,
+        features: np.ndarray,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> np.ndarray:
+        """Score a whole feature matrix with a single call per model"""
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        
+        members = self.registry.resolve(model, weights)
+        with metrics.stage("batch_model_predict"):
+            predictions = self.registry.predict(features, members)
+        return np.maximum(predictions, 0)  # Ensure non-negative
+
 
 class ModelManager:
-    """Manages XGBoost model loading and predictions"""
+    """Manages model loading and predictions"""
     
     def __init__(self):
-        self.model = None
-        self.data = None
+        self.state = ServingState(ModelRegistry(max_workers=ENSEMBLE_WORKERS), None, 0)
+        self._lock = threading.RLock()  # Serializes publishing new states
+        self._reload_lock = threading.Lock()  # One reload at a time
+    
+    @property
+    def registry(self) -> ModelRegistry:
+        return self.state.registry
+    
+    @property
+    def snapshot(self) -> Optional[DataSnapshot]:
+        return self.state.snapshot
+    
+    @property
+    def version(self) -> int:
+        """Bumped on every successful model or data load"""
+        return self.state.version
+    
+    @property
+    def model(self):
+        """Scorer of the default model, or None before it is loaded"""
+        return self.state.model
+    
+    def _publish(
+        self,
+        registry: Optional[ModelRegistry] = None,
+        snapshot: Optional[DataSnapshot] = None,
+        prepare: Optional[Callable[[ServingState], object]] = None
+    ) -> ServingState:
+        """
+        Swap in a new state in one assignment, keeping whatever is not replaced
+        
+        `prepare` gets the new state before requests can see it (e.g. to warm
+        derived tables). Cached results of the previous version are dropped.
+        """
+        with self._lock:
+            current = self.state
+            state = ServingState(
+                registry if registry is not None else current.registry,
+                snapshot if snapshot is not None else current.snapshot,
+                current.version + 1
+            )
+            if prepare is not None:
+                prepare(state)
+            self.state = state
+        prediction_cache.invalidate()
+        return state
+    
+    @staticmethod
+    def _check_feature_order(model_feature_names: Optional[list], feature_names_path: Path) -> None:
+        """Make sure the model was trained on the feature spec, so rows can be passed as raw arrays"""
+        if model_feature_names:
+            FEATURE_SPEC.validate(model_feature_names, 'model')
+        if not FEATURE_SPEC.validate_file(feature_names_path):
+            print(f"⚠ Feature names file not found: {feature_names_path}")
+    
+    def load_model(
+        self,
+        model_path: Path,
+        feature_names_path: Path = FEATURE_NAMES_PATH,
+        name: str = DEFAULT_MODEL,
+        scaler_path: Optional[Path] = None
+    ) -> bool:
+        """
+        Load a model from disk into the registry under `name`
         
-    def load_model(self, model_path: Path) -> bool:
-        """Load XGBoost model from disk"""
+        Pickled XGBoost and LightGBM models are scored through their native
+        boosters, linear models through their coefficients (behind the scaler,
+        if given). A compiled .npz model (see src.model_utils.export_compiled_model)
+        is scored with NumPy alone, without importing the model libraries.
+        """
         try:
-            if model_path.exists():
-                self.model = joblib.load(model_path)
-                print(f"✓ XGBoost model loaded from {model_path}")
-                return True
-            else:
+            if not model_path.exists():
                 print(f"✗ Model file not found: {model_path}")
                 return False
+            
+            scorer = load_scorer(model_path, scaler_path)
+            self._check_feature_order(scorer.feature_names, feature_names_path)
+            with self._lock:
+                registry = self.state.registry.copy()
+                registry.add(name, scorer, default=(name == DEFAULT_MODEL))
+                self._publish(registry=registry)
+            print(f"✓ {name} model ({scorer.source}) loaded from {model_path}")
+            return True
         except Exception as e:
-            print(f"✗ Failed to load model: {e}")
+            print(f"✗ Failed to load {name} model: {e}")
             return False
     
-    def load_data(self, data_path: Path) -> bool:
-        """Load processed training data"""
+    def load_models(
+        self,
+        model_paths: Dict[str, Path],
+        scaled_models: Tuple[str, ...] = (),
+        scaler_path: Optional[Path] = None,
+        feature_names_path: Path = FEATURE_NAMES_PATH
+    ) -> Dict[str, bool]:
+        """
+        Load several models; only those in scaled_models get the scaler
+        
+        Returns:
+            Whether each model loaded
+        """
+        return {
+            name: self.load_model(
+                path,
+                feature_names_path,
+                name=name,
+                scaler_path=scaler_path if name in scaled_models else None
+            )
+            for name, path in model_paths.items()
+        }
+    
+    def load_data(
+        self,
+        data_path: Path,
+        schema: Optional[Dict[str, Union[str, type]]] = SALES_SCHEMA
+    ) -> bool:
+        """
+        Load processed training data from a columnar bundle directory or CSV
+        
+        Args:
+            data_path: Columnar bundle directory or processed CSV
+            schema: Column dtypes to downcast CSV data to (None keeps the parsed dtypes)
+        """
         try:
-            if data_path.exists():
-                self.data = pd.read_csv(data_path)
-                self.data['date'] = pd.to_datetime(self.data['date'])
-                print(f"✓ Data loaded: {len(self.data)} records")
-                return True
-            else:
+            if not data_path.exists():
                 print(f"✗ Data file not found: {data_path}")
                 return False
+            
+            # Build index and aggregates off to the side, then swap in one assignment
+            snapshot = self._read_data(data_path, schema)
+            self._publish(snapshot=snapshot)
+            print(f"✓ Data loaded: {snapshot.records} records, {len(snapshot.series_index)} store-item series")
+            return True
         except Exception as e:
             print(f"✗ Failed to load data: {e}")
             return False
     
-    def predict(self, features: pd.DataFrame) -> float:
-        """Make prediction using XGBoost model"""
-        if self.model is None:
-            raise ValueError("Model not loaded")
+    @staticmethod
+    def _read_data(
+        data_path: Path,
+        schema: Optional[Dict[str, Union[str, type]]] = SALES_SCHEMA
+    ) -> DataSnapshot:
+        """Read a columnar bundle or CSV into a new snapshot"""
+        aggregates = None
+        if data_path.is_dir():
+            # Memory-mapped, already typed and sorted
+            columns = load_columnar(data_path)
+            aggregates = load_columnar_aggregates(data_path)
+            print(f"✓ Memory: {columns_nbytes(columns) / 1e6:.1f} MB mapped")
+        else:
+            data = pd.read_csv(data_path, usecols=['date', 'store', 'item', 'sales'])
+            columns = {
+                'store': data['store'].to_numpy(),
+                'item': data['item'].to_numpy(),
+                'day': day_number(pd.to_datetime(data['date']).to_numpy()),
+                'sales': data['sales'].to_numpy()
+            }
+            if schema is not None:
+                before = columns_nbytes(columns)
+                columns = apply_schema(columns, schema)
+                print(f"✓ Memory: {before / 1e6:.1f} MB → {columns_nbytes(columns) / 1e6:.1f} MB")
+        return DataSnapshot(columns, aggregates)
+    
+    def reload(
+        self,
+        model_paths: Dict[str, Path],
+        data_path: Path,
+        scaled_models: Tuple[str, ...] = (),
+        scaler_path: Optional[Path] = None,
+        feature_names_path: Path = FEATURE_NAMES_PATH,
+        prepare: Optional[Callable[[ServingState], object]] = None
+    ) -> Dict:
+        """
+        Reload every model and the data without interrupting serving
         
-        prediction = self.model.predict(features)[0]
-        return max(0, float(prediction))  # Ensure non-negative
+        The new registry and snapshot are built next to the ones being served
+        and published together, so in-flight requests finish on the state they
+        started with. Models whose file is missing are left out, as at startup;
+        any other failure leaves the current state untouched.
+        
+        Args:
+            prepare: Called with the new state just before it is published
+        
+        Raises:
+            ReloadInProgressError: If another reload is still running
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise ReloadInProgressError("A reload is already in progress")
+        try:
+            timings = {}
+            start = time.perf_counter()
+            registry = self.state.registry.empty_copy()
+            for name, path in model_paths.items():
+                if not path.exists():
+                    print(f"⚠ Model file not found, skipping: {path}")
+                    continue
+                scorer = load_scorer(path, scaler_path if name in scaled_models else None)
+                self._check_feature_order(scorer.feature_names, feature_names_path)
+                registry.add(name, scorer, default=(name == DEFAULT_MODEL))
+            if registry.get(DEFAULT_MODEL) is None:
+                raise FileNotFoundError(f"Default model '{DEFAULT_MODEL}' not found")
+            timings['models'] = round(time.perf_counter() - start, 3)
+            
+            if not data_path.exists():
+                raise FileNotFoundError(f"Data file not found: {data_path}")
+            snapshot = self._read_data(data_path)
+            timings['data'] = round(time.perf_counter() - start - timings['models'], 3)
+            
+            state = self._publish(registry, snapshot, prepare)
+            timings['total'] = round(time.perf_counter() - start, 3)
+            print(f"✓ Reloaded {len(registry.scorers)} models and {snapshot.records} records as version {state.version}")
+            return {
+                'version': state.version,
+                'models': list(registry.scorers),
+                'records': snapshot.records,
+                'timings': timings
+            }
+        finally:
+            self._reload_lock.release()
+    
+    def predict(
+        self,
+        features: Union[pd.DataFrame, np.ndarray],
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> float:
+        """Make prediction for one row of features with the current state"""
+        return self.state.predict(features, model, weights)
+    
+    def predict_batch(
+        self,
+        features: np.ndarray,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> np.ndarray:
+        """Score a whole feature matrix with the current state"""
+        return self.state.predict_batch(features, model, weights)
     
     def is_ready(self) -> bool:
         """Check if model and data are loaded"""
-        return self.model is not None and self.data is not None
+        return self.state.is_ready()
 
 
 # Global model manager instance
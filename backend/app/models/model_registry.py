@@ -0,0 +1,178 @@
+"""
+Registry of loaded models with per-request model selection and ensembles
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import joblib
+import numpy as np
+
+from app.models.compiled_model import CompiledModel
+
+
+class UnknownModelError(ValueError):
+    """Raised when a request names a model that is not loaded (answered with 400)"""
+    
+    status_code = 400
+
+
+class XGBoostScorer:
+    """Scores an XGBRegressor through its native booster on raw arrays"""
+    
+    source = "xgboost"
+    
+    def __init__(self, model):
+        self.booster = model.get_booster()
+        self.feature_names: List[str] = list(self.booster.feature_names or [])
+        self.input_dtype = np.dtype(np.float32)  # XGBoost compares in single precision
+        self.missing = model.missing
+        
+        # Same trees the sklearn wrapper would use (all, or up to early stopping)
+        if hasattr(self.booster, 'best_iteration'):
+            self.iteration_range = (0, self.booster.best_iteration + 1)
+        else:
+            self.iteration_range = (0, 0)
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Raw-array prediction, skipping DataFrame and DMatrix handling"""
+        return self.booster.inplace_predict(
+            X,
+            iteration_range=self.iteration_range,
+            missing=self.missing,
+            validate_features=False
+        )
+
+
+class LightGBMScorer:
+    """Scores an LGBMRegressor through its booster on raw arrays"""
+    
+    source = "lightgbm"
+    
+    def __init__(self, model):
+        self.booster = model.booster_
+        self.feature_names: List[str] = list(self.booster.feature_name())
+        self.input_dtype = np.dtype(np.float64)
+        self.num_iteration = getattr(model, 'best_iteration_', 0) or None
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.booster.predict(X, num_iteration=self.num_iteration)
+
+
+class LinearScorer:
+    """Scores a linear model, standardizing features first when it was trained on scaled data"""
+    
+    def __init__(self, model, scaler=None):
+        self.source = type(model).__name__.lower()
+        self.feature_names: List[str] = list(getattr(scaler, 'feature_names_in_', []))
+        self.input_dtype = np.dtype(np.float64)
+        self.coef = np.ravel(model.coef_)
+        self.intercept = float(np.ravel(model.intercept_)[0])
+        self.mean = scaler.mean_ if scaler is not None and scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler is not None and scaler.with_std else None
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Same arithmetic as scaler.transform followed by model.predict"""
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale is not None:
+            X = X / self.scale
+        return X @ self.coef + self.intercept
+
+
+def load_scorer(model_path: Path, scaler_path: Optional[Path] = None):
+    """
+    Load a model file into a raw-array scorer
+    
+    Args:
+        model_path: Compiled .npz model, or joblib-pickled XGBoost, LightGBM or linear model
+        scaler_path: StandardScaler a pickled linear model was trained behind (optional)
+    """
+    if model_path.suffix == '.npz':
+        # Compiled linear models already have the scaler folded in
+        return CompiledModel.load(model_path)
+    
+    model = joblib.load(model_path)
+    module = type(model).__module__
+    if module.startswith('xgboost'):
+        return XGBoostScorer(model)
+    if module.startswith('lightgbm'):
+        return LightGBMScorer(model)
+    if hasattr(model, 'coef_'):
+        scaler = joblib.load(scaler_path) if scaler_path is not None else None
+        return LinearScorer(model, scaler)
+    raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+
+class ModelRegistry:
+    """Named scorers sharing one feature matrix; ensembles score their members in parallel"""
+    
+    def __init__(self, max_workers: int, pool: Optional[ThreadPoolExecutor] = None):
+        self.max_workers = max_workers
+        self.scorers: Dict[str, object] = {}
+        self.default: Optional[str] = None
+        self._pool = pool or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ensemble")
+    
+    def empty_copy(self) -> "ModelRegistry":
+        """A new registry without models, sharing this one's worker threads"""
+        return ModelRegistry(self.max_workers, pool=self._pool)
+    
+    def copy(self) -> "ModelRegistry":
+        """A new registry with the same models, to modify without affecting this one"""
+        registry = self.empty_copy()
+        registry.scorers = dict(self.scorers)
+        registry.default = self.default
+        return registry
+    
+    def add(self, name: str, scorer, default: bool = False) -> None:
+        """Register a scorer, replacing any previous one with the same name"""
+        self.scorers = {**self.scorers, name: scorer}
+        if default or self.default is None:
+            self.default = name
+    
+    def get(self, name: Optional[str] = None):
+        """The named scorer, or the default one"""
+        return self.scorers.get(name or self.default)
+    
+    def resolve(
+        self,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[Tuple[str, float], ...]:
+        """
+        Members and normalized weights for a model or ensemble selection
+        
+        Raises:
+            UnknownModelError: If a named model is not loaded
+        """
+        if weights:
+            unknown = sorted(set(weights) - set(self.scorers))
+            if unknown:
+                raise UnknownModelError(f"Unknown model(s): {', '.join(unknown)}")
+            total = sum(weights.values())
+            if total <= 0 or any(weight < 0 for weight in weights.values()):
+                raise UnknownModelError("Ensemble weights must be non-negative with a positive sum")
+            return tuple(sorted((name, weight / total) for name, weight in weights.items() if weight > 0))
+        
+        name = model or self.default
+        if name not in self.scorers:
+            raise UnknownModelError(f"Unknown model: {name}")
+        return ((name, 1.0),)
+    
+    def input_dtype(self, members: Tuple[Tuple[str, float], ...]) -> np.dtype:
+        """Narrowest feature dtype every member can score without losing precision"""
+        return np.result_type(*(self.scorers[name].input_dtype for name, _ in members))
+    
+    def predict(self, features: np.ndarray, members: Tuple[Tuple[str, float], ...]) -> np.ndarray:
+        """Score one feature matrix with a single model or a weighted ensemble"""
+        if len(members) == 1:
+            return self.scorers[members[0][0]].predict(features)
+        
+        # Members run concurrently (the model libraries release the GIL while scoring)
+        futures = [
+            (self._pool.submit(self.scorers[name].predict, features), weight)
+            for name, weight in members
+        ]
+        ensemble = np.zeros(len(features), dtype=np.float64)
+        for future, weight in futures:
+            ensemble += future.result() * weight
+        return ensemble
@@ -0,0 +1,75 @@
+"""
+Compact dtype schema for the in-memory sales columns
+"""
+from typing import Dict, Union
+import numpy as np
+
+
+# Narrowest dtypes that hold the Kaggle data: 10 stores, 50 items, sales < 32k
+SALES_SCHEMA: Dict[str, Union[str, type]] = {
+    'store': np.int8,
+    'item': np.int8,
+    'day': np.int32,    # Days since 1970-01-01
+    'sales': np.int16,
+}
+
+# Version of the columnar bundle layout (app.models.columnar_store); kept here,
+# free of app imports, so src can load it to write bundles
+COLUMNAR_FORMAT_VERSION = 1
+
+# Candidate integer types for 'auto' schema entries, narrowest first
+AUTO_INTEGER_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def narrowest_integer_dtype(values: np.ndarray) -> np.dtype:
+    """Smallest signed integer dtype that holds every value"""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in AUTO_INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise ValueError("Values do not fit in int64")
+
+
+def downcast_column(values: np.ndarray, name: str, dtype: Union[str, type]) -> np.ndarray:
+    """Cast a column to a narrower integer dtype, refusing values that would not survive"""
+    if len(values) and np.issubdtype(values.dtype, np.floating) and not np.isfinite(values).all():
+        raise ValueError(f"Column '{name}' has missing or infinite values")
+    
+    if dtype == 'auto':
+        target = narrowest_integer_dtype(values)
+    else:
+        target = np.dtype(dtype)
+        info = np.iinfo(target)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            raise ValueError(f"Column '{name}' has values outside the {target} range")
+    
+    narrowed = values.astype(target)
+    if not np.array_equal(narrowed, values):
+        raise ValueError(f"Column '{name}' has non-integer values")
+    return narrowed
+
+
+def apply_schema(
+    columns: Dict[str, np.ndarray],
+    schema: Dict[str, Union[str, type]]
+) -> Dict[str, np.ndarray]:
+    """
+    Downcast columns to the dtypes in a schema
+    
+    Each schema entry is a NumPy integer dtype, or 'auto' for the narrowest
+    signed integer dtype that holds the column. Columns not in the schema are
+    kept as they are.
+    
+    Raises:
+        ValueError: If a column would lose information
+    """
+    return {
+        name: downcast_column(values, name, schema[name]) if name in schema else values
+        for name, values in columns.items()
+    }
+
+
+def columns_nbytes(columns: Dict[str, np.ndarray]) -> int:
+    """Total memory held by a set of columns"""
+    return sum(values.nbytes for values in columns.values())
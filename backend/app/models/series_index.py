@@ -0,0 +1,111 @@
+"""
+Per-(store, item) columnar index over the sales history
+"""
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+
+def day_number(dates) -> np.ndarray:
+    """Convert dates (datetime64 arrays, Timestamps, strings) to days since 1970-01-01"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def pair_keys(stores, items) -> np.ndarray:
+    """One int64 key per (store, item), sorting like the (store, item) tuples"""
+    return np.asarray(stores, dtype=np.int64) * (1 << 32) + np.asarray(items, dtype=np.int64)
+
+
+def find_keys(keys: np.ndarray, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of many queries in sorted unique keys, and whether each was found"""
+    if len(keys) == 0:
+        return np.zeros(len(queries), dtype=np.intp), np.zeros(len(queries), dtype=bool)
+    positions = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+    return positions, keys[positions] == queries
+
+
+class SeriesIndex:
+    """Sorted, contiguous day/sales arrays with O(1) lookup per store-item"""
+
+    def __init__(
+        self,
+        days: np.ndarray,
+        sales: np.ndarray,
+        offsets: Dict[Tuple[int, int], Tuple[int, int]]
+    ):
+        self.days = days
+        self.sales = sales
+        self.offsets = offsets
+
+        # The offsets again as arrays sorted by key, for looking up many series at once
+        pairs = np.array(list(offsets), dtype=np.int64).reshape(-1, 2)
+        bounds = np.array(list(offsets.values()), dtype=np.int64).reshape(-1, 2)
+        keys = pair_keys(pairs[:, 0], pairs[:, 1])
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self._starts = bounds[order, 0]
+        self._stops = bounds[order, 1]
+
+    @classmethod
+    def from_columns(
+        cls,
+        stores: np.ndarray,
+        items: np.ndarray,
+        days: np.ndarray,
+        sales: np.ndarray
+    ) -> "SeriesIndex":
+        """
+        Build the index from parallel store/item/day/sales columns
+
+        Columns already sorted by (store, item, day), e.g. a memory-mapped
+        columnar bundle, are used as-is without copying.
+        """
+        store_step = np.diff(stores.astype(np.int64))
+        item_step = np.diff(items.astype(np.int64))
+        day_step = np.diff(days.astype(np.int64))
+        out_of_order = (store_step < 0) | ((store_step == 0) & (
+            (item_step < 0) | ((item_step == 0) & (day_step < 0))
+        ))
+        if out_of_order.any():
+            # Stable sort keeps the original row order for duplicate dates
+            order = np.lexsort((days, items, stores))
+            stores, items, days, sales = stores[order], items[order], days[order], sales[order]
+
+        # Series boundaries are wherever the (store, item) key changes
+        changes = np.flatnonzero((stores[1:] != stores[:-1]) | (items[1:] != items[:-1])) + 1
+        starts = np.concatenate(([0], changes))
+        stops = np.concatenate((changes, [len(days)]))
+
+        offsets = {
+            (int(stores[start]), int(items[start])): (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        } if len(days) > 0 else {}
+
+        return cls(days=days, sales=sales, offsets=offsets)
+
+    def get(self, store: int, item: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return (days, sales) views for a store-item, or None if unknown"""
+        bounds = self.offsets.get((store, item))
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return self.days[start:stop], self.sales[start:stop]
+
+    def bounds(
+        self,
+        stores: np.ndarray,
+        items: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Locate many store-items at once
+
+        Returns:
+            (starts, stops, found): each series is days[start:stop] and
+            sales[start:stop]; unknown store-items get empty bounds
+        """
+        positions, found = find_keys(self._keys, pair_keys(stores, items))
+        if len(self._keys) == 0:
+            return np.zeros(len(found), dtype=np.int64), np.zeros(len(found), dtype=np.int64), found
+        return np.where(found, self._starts[positions], 0), np.where(found, self._stops[positions], 0), found
+
+    def __len__(self) -> int:
+        return len(self.offsets)
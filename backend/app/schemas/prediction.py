@@ -2,7 +2,7 @@
 Pydantic schemas for API requests and responses
 """
 from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 
@@ -11,6 +11,10 @@ class PredictionRequest(BaseModel):
     store: int = Field(..., ge=1, le=10, description="Store ID (1-10)")
     item: int = Field(..., ge=1, le=50, description="Item ID (1-50)")
     date: str = Field(..., description="Date in YYYY-MM-DD format")
+    model: Optional[str] = Field(None, description="Model to use: xgboost, lightgbm or ridge (default: xgboost)")
+    ensemble: Optional[Dict[str, float]] = Field(
+        None, description='Weighted ensemble instead of one model, e.g. {"xgboost": 0.7, "lightgbm": 0.3}'
+    )
     
     @validator('date')
     def validate_date(cls, v):
@@ -19,6 +23,12 @@ class PredictionRequest(BaseModel):
             return v
         except ValueError:
             raise ValueError('Date must be in YYYY-MM-DD format')
+    
+    @validator('ensemble')
+    def validate_ensemble(cls, v, values):
+        if v is not None and values.get('model') is not None:
+            raise ValueError('Use either model or ensemble, not both')
+        return v
 
 
 class BatchPredictionRequest(BaseModel):
@@ -40,8 +50,13 @@ class PredictionResponse(BaseModel):
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
+    live: bool
+    ready: bool
+    stage: str
     model_loaded: bool
     data_loaded: bool
+    startup_timings: Dict[str, float]
+    version: int
     timestamp: str
 
 
@@ -56,6 +71,19 @@ class ModelInfoResponse(BaseModel):
     loaded: bool
 
 
+class RegisteredModel(BaseModel):
+    """A model available for per-request selection"""
+    name: str
+    source: str
+    default: bool
+
+
+class ModelListResponse(BaseModel):
+    """Models loaded in the registry"""
+    default: Optional[str]
+    models: List[RegisteredModel]
+
+
 class AnalyticsResponse(BaseModel):
     """Analytics response"""
     store: int
@@ -71,3 +99,44 @@ class ForecastResponse(BaseModel):
     item: int
     forecast_days: int
     predictions: List[PredictionResponse]
+
+
+class GridForecastResponse(BaseModel):
+    """
+    Forecast for many store-item series, packed as matrices
+    
+    Row r of every matrix is series[r]; column d is dates[d].
+    """
+    method: str
+    dates: List[str]
+    series: List[List[int]] = Field(..., description="[store, item] of each matrix row")
+    missing: List[List[int]] = Field(..., description="[store, item] pairs without historical data")
+    predicted_sales: List[List[float]]
+    recommended_inventory: List[List[int]]
+    confidence_lower: List[List[float]]
+    confidence_upper: List[List[float]]
+
+
+class CacheStatsResponse(BaseModel):
+    """Prediction cache statistics"""
+    enabled: bool
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    expirations: int
+    invalidations: int
+    version: int
+
+
+class ReloadResponse(BaseModel):
+    """Result of a hot reload of the models and data"""
+    status: str
+    previous_version: int
+    version: int
+    models: List[str]
+    records: int
+    timings: Dict[str, float]
@@ -0,0 +1,152 @@
+"""
+Streaming batch predictions: NDJSON rows in, NDJSON results out, one chunk at a time
+"""
+import asyncio
+import json
+import tempfile
+from typing import IO, AsyncIterator, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.models.model_loader import ServingState
+from app.services.prediction_service import prediction_service
+from app.schemas.prediction import PredictionRequest
+from app.core.executor import prediction_executor, ExecutorBusyError
+from app.core.metrics import metrics
+from app.core.config import (
+    STREAM_CHUNK_SIZE,
+    STREAM_MAX_LINE_BYTES,
+    STREAM_SPOOL_BYTES,
+    PREDICTION_RETRY_AFTER_SECONDS
+)
+
+
+def validation_message(error: ValidationError) -> str:
+    """One-line summary of a pydantic validation error"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+class PredictionStreamer:
+    """
+    Scores an NDJSON stream of prediction requests in fixed-size chunks
+    
+    Each input line is one PredictionRequest object. Every line produces one
+    output line, in input order: the prediction, or an error record naming the
+    line number. Only one chunk of rows and results is in memory at a time, so
+    memory stays flat however long the stream is.
+    
+    The body is spooled (to disk beyond spool_bytes) before results start
+    streaming: once a streaming response has begun, the server's receive
+    channel only reports disconnects, so the body cannot be read alongside.
+    """
+    
+    def __init__(self, chunk_size: int, max_line_bytes: int, spool_bytes: int):
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.spool_bytes = spool_bytes
+    
+    async def spool(self, body: AsyncIterator[bytes]) -> IO[bytes]:
+        """Receive a request body, whatever its chunking, into a rewound file"""
+        file = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        async for data in body:
+            file.write(data)
+        file.seek(0)
+        return file
+    
+    def lines(self, file: IO[bytes]) -> Iterator[Tuple[int, Optional[bytes]]]:
+        """
+        Numbered non-blank lines of a file
+        
+        Lines longer than max_line_bytes are yielded as None and skipped.
+        """
+        number = 0
+        while True:
+            line = file.readline(self.max_line_bytes + 1)
+            if not line:
+                return
+            number += 1
+            if len(line) > self.max_line_bytes and not line.endswith(b"\n"):
+                # Drop the rest of the oversized line
+                while line and not line.endswith(b"\n"):
+                    line = file.readline(self.max_line_bytes + 1)
+                yield number, None
+            elif line.strip():
+                yield number, line
+    
+    @staticmethod
+    def score_chunk(lines: List[Tuple[int, Optional[bytes]]], state: ServingState) -> str:
+        """Parse, validate and score one chunk of lines, returning its NDJSON output"""
+        records: List[dict] = []
+        requests, selections, positions = [], [], []
+        for number, line in lines:
+            if line is None:
+                records.append({"line": number, "error": "Line too long"})
+                continue
+            try:
+                request = PredictionRequest.model_validate_json(line)
+                state.registry.resolve(request.model, request.ensemble)
+            except ValidationError as e:
+                records.append({"line": number, "error": validation_message(e)})
+                continue
+            except ValueError as e:
+                records.append({"line": number, "error": str(e)})
+                continue
+            
+            records.append({"line": number, "store": request.store, "item": request.item, "date": request.date})
+            requests.append((request.store, request.item, request.date))
+            selections.append((request.model, request.ensemble))
+            positions.append(len(records) - 1)
+        
+        # Valid rows share one vectorized feature build and one call per model
+        if requests:
+            try:
+                results = prediction_service.predict_batch(requests, selections, state)
+            except Exception as e:
+                results = [e] * len(requests)
+            for position, result in zip(positions, results):
+                record = records[position]
+                if isinstance(result, Exception):
+                    record["error"] = f"Prediction failed: {str(result)}"
+                elif result is None:
+                    record["error"] = f"No historical data for store {record['store']}, item {record['item']}"
+                else:
+                    record.update(result)
+        
+        return "".join(json.dumps(record) + "\n" for record in records)
+    
+    async def _score(self, lines: List[Tuple[int, Optional[bytes]]], state: ServingState) -> str:
+        """Score a chunk on the prediction executor, waiting for room rather than failing mid-stream"""
+        while True:
+            try:
+                return await prediction_executor.run(self.score_chunk, lines, state)
+            except ExecutorBusyError:
+                await asyncio.sleep(PREDICTION_RETRY_AFTER_SECONDS)
+    
+    async def stream(self, file: IO[bytes], state: ServingState) -> AsyncIterator[str]:
+        """NDJSON results for a spooled NDJSON body, one chunk at a time; closes the file"""
+        rows = 0
+        try:
+            chunk: List[Tuple[int, Optional[bytes]]] = []
+            for numbered_line in self.lines(file):
+                chunk.append(numbered_line)
+                if len(chunk) >= self.chunk_size:
+                    rows += len(chunk)
+                    yield await self._score(chunk, state)
+                    chunk = []
+            if chunk:
+                rows += len(chunk)
+                yield await self._score(chunk, state)
+        finally:
+            file.close()
+            metrics.observe_batch("/batch-predict/stream", rows)
+
+
+# Global prediction streamer instance
+prediction_streamer = PredictionStreamer(
+    chunk_size=STREAM_CHUNK_SIZE,
+    max_line_bytes=STREAM_MAX_LINE_BYTES,
+    spool_bytes=STREAM_SPOOL_BYTES
+)
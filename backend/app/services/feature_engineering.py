@@ -3,183 +3,159 @@ Feature engineering service for prediction
 """
 import pandas as pd
 import numpy as np
-from datetime import timedelta
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
+
+from app.models.aggregates import AggregateTable
+from app.models.series_index import SeriesIndex, day_number
+from app.services.feature_spec import FeatureSpec, segment_columns, series_columns, time_columns
+from app.core.config import LAG_PERIODS, ROLLING_WINDOWS
+from app.core.metrics import metrics
+
+
+# One feature definition for training and serving (XGBoost is sensitive to feature order)
+FEATURE_SPEC = FeatureSpec(LAG_PERIODS, ROLLING_WINDOWS)
+FEATURE_ORDER = FEATURE_SPEC.feature_names
 
 
 class FeatureEngineer:
     """Handles feature engineering for predictions"""
     
-    @staticmethod
-    def create_time_features(df: pd.DataFrame) -> pd.DataFrame:
-        """Create time-based features"""
-        df = df.copy()
-        
-        # Extract date components
-        df['year'] = df['date'].dt.year
-        df['month'] = df['date'].dt.month
-        df['day'] = df['date'].dt.day
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['day_of_year'] = df['date'].dt.dayofyear
-        df['week_of_year'] = df['date'].dt.isocalendar().week
-        df['quarter'] = df['date'].dt.quarter
+    @classmethod
+    def prepare_features(
+        cls,
+        store: int,
+        item: int,
+        date: str,
+        series: Optional[Tuple[np.ndarray, np.ndarray]],
+        aggregates: AggregateTable,
+        lag_periods: list,
+        rolling_windows: list
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prepare all features for prediction
         
-        # Cyclical encoding
-        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-        df['day_of_week_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-        df['day_of_week_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-        df['day_of_year_sin'] = np.sin(2 * np.pi * df['day_of_year'] / 365)
-        df['day_of_year_cos'] = np.cos(2 * np.pi * df['day_of_year'] / 365)
+        Args:
+            series: (days, sales) views of the store-item's sorted history
         
-        # Boolean features
-        df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-        df['is_month_start'] = df['date'].dt.is_month_start.astype(int)
-        df['is_month_end'] = df['date'].dt.is_month_end.astype(int)
+        Returns:
+            Tuple of (one-row features matrix in FEATURE_ORDER, store_item_historical_sales)
+        """
+        pred_date = pd.to_datetime(date)
         
-        return df
+        if series is None or len(series[0]) == 0:
+            raise ValueError(f"No historical data for store {store}, item {item}")
+        days, sales = series
+        
+        # The batch path's column builders for a batch of one, with the
+        # per-series engine for lags and windows (cheaper for a single series)
+        with metrics.stage("time_features"):
+            columns = cls.create_time_columns(np.array([pred_date], dtype='datetime64[ns]'))
+            columns['item'] = np.array([item], dtype=np.float64)
+        with metrics.stage("series_features"):
+            columns.update(cls.create_series_features_batch(
+                days, sales, day_number([pred_date]), lag_periods, rolling_windows
+            ))
+        with metrics.stage("aggregate_features"):
+            columns.update(cls.create_aggregate_columns([store], [item], aggregates))
+        
+        return np.column_stack([columns[name] for name in FEATURE_ORDER]), sales
     
     @staticmethod
-    def create_lag_features(
-        pred_row: pd.DataFrame,
-        historical_data: pd.DataFrame,
-        pred_date: pd.Timestamp,
-        lag_periods: list
-    ) -> pd.DataFrame:
-        """Create lag features from historical data"""
-        pred_row = pred_row.copy()
-        
-        for lag in lag_periods:
-            lag_date = pred_date - timedelta(days=lag)
-            lag_value = historical_data[
-                historical_data['date'] <= lag_date
-            ]['sales'].tail(1)
-            
-            if len(lag_value) > 0:
-                pred_row[f'sales_lag_{lag}'] = lag_value.values[0]
-            else:
-                pred_row[f'sales_lag_{lag}'] = historical_data['sales'].mean()
-        
-        return pred_row
+    def create_time_columns(dates: np.ndarray) -> Dict[str, np.ndarray]:
+        """Create time features for many dates at once, as float columns"""
+        return time_columns(dates)
     
     @staticmethod
-    def create_rolling_features(
-        pred_row: pd.DataFrame,
-        historical_data: pd.DataFrame,
-        pred_date: pd.Timestamp,
+    def create_aggregate_columns(
+        stores: np.ndarray,
+        items: np.ndarray,
+        aggregates: AggregateTable
+    ) -> Dict[str, np.ndarray]:
+        """Look up store, item and store-item aggregate features for many rows"""
+        store_stats = aggregates.stores(stores)
+        item_stats = aggregates.items(items)
+        store_item_stats = aggregates.store_items(stores, items)
+        
+        columns = {}
+        for i, stat in enumerate(['avg', 'std', 'median']):
+            columns[f'store_{stat}_sales'] = store_stats[:, i]
+            columns[f'item_{stat}_sales'] = item_stats[:, i]
+        columns['store_item_avg_sales'] = store_item_stats[:, 0]
+        columns['store_item_std_sales'] = store_item_stats[:, 1]
+        return columns
+    
+    @staticmethod
+    def create_series_features_batch(
+        days: np.ndarray,
+        sales: np.ndarray,
+        pred_days: np.ndarray,
+        lag_periods: list,
         rolling_windows: list
-    ) -> pd.DataFrame:
-        """Create rolling window features"""
-        pred_row = pred_row.copy()
-        
-        for window in rolling_windows:
-            window_data = historical_data[
-                historical_data['date'] < pred_date
-            ].tail(window)['sales']
-            
-            if len(window_data) > 0:
-                pred_row[f'sales_rolling_mean_{window}'] = window_data.mean()
-                pred_row[f'sales_rolling_std_{window}'] = window_data.std()
-                pred_row[f'sales_rolling_min_{window}'] = window_data.min()
-                pred_row[f'sales_rolling_max_{window}'] = window_data.max()
-            else:
-                pred_row[f'sales_rolling_mean_{window}'] = historical_data['sales'].mean()
-                pred_row[f'sales_rolling_std_{window}'] = historical_data['sales'].std()
-                pred_row[f'sales_rolling_min_{window}'] = historical_data['sales'].min()
-                pred_row[f'sales_rolling_max_{window}'] = historical_data['sales'].max()
-        
-        return pred_row
+    ) -> Dict[str, np.ndarray]:
+        """Create lag and rolling features for many prediction dates of one store-item"""
+        return series_columns(days, sales, pred_days, lag_periods, rolling_windows)
     
     @staticmethod
-    def create_aggregate_features(
-        pred_row: pd.DataFrame,
-        store: int,
-        item: int,
-        store_item_data: pd.DataFrame,
-        all_data: pd.DataFrame
-    ) -> pd.DataFrame:
-        """Create store and item aggregate features"""
-        pred_row = pred_row.copy()
-        
-        # Store-level statistics
-        store_data = all_data[all_data['store'] == store]['sales']
-        pred_row['store_avg_sales'] = store_data.mean()
-        pred_row['store_std_sales'] = store_data.std()
-        pred_row['store_median_sales'] = store_data.median()
-        
-        # Item-level statistics
-        item_data = all_data[all_data['item'] == item]['sales']
-        pred_row['item_avg_sales'] = item_data.mean()
-        pred_row['item_std_sales'] = item_data.std()
-        pred_row['item_median_sales'] = item_data.median()
-        
-        # Store-Item combination statistics
-        pred_row['store_item_avg_sales'] = store_item_data['sales'].mean()
-        pred_row['store_item_std_sales'] = store_item_data['sales'].std()
-        
-        return pred_row
+    def create_segment_features_batch(
+        days: np.ndarray,
+        sales: np.ndarray,
+        starts: np.ndarray,
+        stops: np.ndarray,
+        pred_days: np.ndarray,
+        lag_periods: list,
+        rolling_windows: list
+    ) -> Dict[str, np.ndarray]:
+        """Create lag and rolling features for many prediction dates, each of the series days[start:stop]"""
+        return segment_columns(days, sales, starts, stops, pred_days, lag_periods, rolling_windows)
     
     @classmethod
-    def prepare_features(
+    def prepare_features_batch(
         cls,
-        store: int,
-        item: int,
-        date: str,
-        all_data: pd.DataFrame,
+        requests: List[Tuple[int, int, str]],
+        series_index: SeriesIndex,
+        aggregates: AggregateTable,
         lag_periods: list,
         rolling_windows: list
-    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Prepare all features for prediction
+        Prepare the feature matrix for many (store, item, date) requests in one pass
+        
+        Every step is a handful of array operations over all rows, whichever
+        store-items they ask for.
         
         Returns:
-            Tuple of (features_df, store_item_historical_data)
+            Tuple of (features matrix in FEATURE_ORDER for requests with history,
+                      boolean mask over requests marking those rows)
         """
-        pred_date = pd.to_datetime(date)
-        
-        # Get historical data for this store-item
-        store_item_data = all_data[
-            (all_data['store'] == store) & 
-            (all_data['item'] == item)
-        ].copy()
-        
-        if len(store_item_data) == 0:
-            raise ValueError(f"No historical data for store {store}, item {item}")
-        
-        # Initialize prediction row
-        pred_row = pd.DataFrame({
-            'date': [pred_date],
-            'store': [store],
-            'item': [item],
-            'sales': [0]
-        })
-        
-        # Add all features
-        pred_row = cls.create_time_features(pred_row)
-        pred_row = cls.create_lag_features(pred_row, store_item_data, pred_date, lag_periods)
-        pred_row = cls.create_rolling_features(pred_row, store_item_data, pred_date, rolling_windows)
-        pred_row = cls.create_aggregate_features(pred_row, store, item, store_item_data, all_data)
-        
-        # Define feature order to match training (XGBoost is sensitive to feature order)
-        feature_order = [
-            'item', 'year', 'month', 'day_of_week', 'day', 'week_of_year', 'quarter',
-            'is_weekend', 'is_month_start', 'is_month_end', 'day_of_year',
-            'month_sin', 'month_cos', 'day_of_week_sin', 'day_of_week_cos',
-            'day_of_year_sin', 'day_of_year_cos',
-            'sales_lag_1', 'sales_lag_3', 'sales_lag_7', 'sales_lag_14',
-            'sales_lag_30', 'sales_lag_60', 'sales_lag_90',
-            'sales_rolling_mean_7', 'sales_rolling_std_7', 'sales_rolling_min_7', 'sales_rolling_max_7',
-            'sales_rolling_mean_14', 'sales_rolling_std_14', 'sales_rolling_min_14', 'sales_rolling_max_14',
-            'sales_rolling_mean_30', 'sales_rolling_std_30', 'sales_rolling_min_30', 'sales_rolling_max_30',
-            'sales_rolling_mean_60', 'sales_rolling_std_60', 'sales_rolling_min_60', 'sales_rolling_max_60',
-            'sales_rolling_mean_90', 'sales_rolling_std_90', 'sales_rolling_min_90', 'sales_rolling_max_90',
-            'store_avg_sales', 'store_std_sales', 'store_median_sales',
-            'item_avg_sales', 'item_std_sales', 'item_median_sales',
-            'store_item_avg_sales', 'store_item_std_sales'
-        ]
-        
-        # Ensure all expected features exist and return in correct order
-        return pred_row[feature_order], store_item_data
+        if not requests:
+            return np.empty((0, len(FEATURE_ORDER))), np.zeros(0, dtype=bool)
+        stores, items, dates = (np.asarray(column) for column in zip(*requests))
+        
+        with metrics.stage("batch_history_lookup"):
+            starts, stops, found = series_index.bounds(stores, items)
+        if not found.any():
+            return np.empty((0, len(FEATURE_ORDER))), found
+        stores, items, dates = stores[found], items[found], dates[found]
+        
+        # Time features for all rows at once
+        with metrics.stage("batch_time_features"):
+            # Validated YYYY-MM-DD strings (zero padding optional), parsed without guessing the format
+            pred_dates = pd.to_datetime(dates, format='ISO8601').to_numpy()
+            columns = cls.create_time_columns(pred_dates)
+            columns['item'] = items.astype(np.float64)
+        
+        # Lag and rolling features, vectorized over all rows and series
+        with metrics.stage("batch_series_features"):
+            columns.update(cls.create_segment_features_batch(
+                series_index.days, series_index.sales, starts[found], stops[found],
+                day_number(pred_dates), lag_periods, rolling_windows
+            ))
+        
+        # Aggregate features from the precomputed table
+        with metrics.stage("batch_aggregate_features"):
+            columns.update(cls.create_aggregate_columns(stores, items, aggregates))
+        
+        return np.column_stack([columns[name] for name in FEATURE_ORDER]), found
 
 
 # Global feature engineer instance
@@ -0,0 +1,428 @@
+"""
+Declarative feature definition and the vectorized engine that computes it
+
+The API (app.services.feature_engineering) and the training pipeline
+(src.data_processing.create_model_features) both build features through
+this module, so training and serving cannot drift apart. It depends on
+NumPy and pandas only, and src loads it straight from this file.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+
+TIME_FEATURES = (
+    'year', 'month', 'day_of_week', 'day', 'week_of_year', 'quarter',
+    'is_weekend', 'is_month_start', 'is_month_end', 'day_of_year',
+    'month_sin', 'month_cos', 'day_of_week_sin', 'day_of_week_cos',
+    'day_of_year_sin', 'day_of_year_cos'
+)
+ROLLING_STATS = ('mean', 'std', 'min', 'max')
+
+
+def sample_std(values: np.ndarray) -> float:
+    """Sample standard deviation (ddof=1), NaN for fewer than two values like pandas"""
+    if len(values) < 2:
+        return np.nan
+    return float(values.std(ddof=1))
+
+
+def time_columns(dates: np.ndarray) -> Dict[str, np.ndarray]:
+    """Calendar features for many dates at once, as float columns"""
+    dates = pd.Series(pd.to_datetime(dates)).dt
+    month = dates.month
+    day_of_week = dates.dayofweek
+    day_of_year = dates.dayofyear
+    columns = {
+        'year': dates.year,
+        'month': month,
+        'day_of_week': day_of_week,
+        'day': dates.day,
+        'week_of_year': dates.isocalendar().week,
+        'quarter': dates.quarter,
+        'is_weekend': (day_of_week >= 5).astype(int),
+        'is_month_start': dates.is_month_start.astype(int),
+        'is_month_end': dates.is_month_end.astype(int),
+        'day_of_year': day_of_year,
+        
+        # Cyclical encoding
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+        'day_of_week_sin': np.sin(2 * np.pi * day_of_week / 7),
+        'day_of_week_cos': np.cos(2 * np.pi * day_of_week / 7),
+        'day_of_year_sin': np.sin(2 * np.pi * day_of_year / 365),
+        'day_of_year_cos': np.cos(2 * np.pi * day_of_year / 365),
+    }
+    return {name: values.to_numpy(dtype=np.float64) for name, values in columns.items()}
+
+
+def range_extremes(values: np.ndarray, max_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sparse tables of running minima and maxima
+    
+    Row `level` holds the min/max of values[i:i + 2**level] at column i, for
+    every level a range of up to `max_count` values needs. One spare column
+    of +inf/-inf lets empty ranges index safely.
+    """
+    levels = max(int(max_count).bit_length(), 1)
+    mins = np.full((levels, len(values) + 1), np.inf)
+    maxs = np.full((levels, len(values) + 1), -np.inf)
+    mins[0, :len(values)] = values
+    maxs[0, :len(values)] = values
+    for level in range(1, levels):
+        half = 1 << (level - 1)
+        width = len(values) - (1 << level) + 1
+        if width <= 0:
+            break
+        mins[level, :width] = np.fmin(mins[level - 1, :width], mins[level - 1, half:half + width])
+        maxs[level, :width] = np.fmax(maxs[level - 1, :width], maxs[level - 1, half:half + width])
+    return mins, maxs
+
+
+def series_columns(
+    days: np.ndarray,
+    sales: np.ndarray,
+    pred_days: np.ndarray,
+    lag_periods: Sequence[int],
+    rolling_windows: Sequence[int],
+    target: str = 'sales',
+    fallback: Optional[Tuple[float, float, float, float]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Lag and rolling features of one series for many prediction days
+    
+    Only history before each prediction day is used. A lag is the last
+    observation on or before the lag date, and a rolling window holds the
+    last `window` observations strictly before the prediction day. Without
+    such history, the whole series' statistic is used instead.
+    
+    Lags and window bounds are binary searches in `days`. Window sums and
+    sums of squares are prefix-sum differences and minima/maxima come from
+    sparse tables, all built over the observations the windows reach
+    rather than the whole series, so one prediction day costs O(log n) plus
+    the longest window, however long the history is.
+    
+    Args:
+        days: Sorted day numbers of the series' observations
+        sales: Observations on those days
+        pred_days: Day numbers to compute features for
+        fallback: Whole-series (mean, std, min, max), when days and sales
+            are only the recent part of the series
+    """
+    # Searching with the array's own dtype, or NumPy converts (copies) all of days
+    pred_days = np.asarray(pred_days).astype(days.dtype, copy=False)
+    lags = np.asarray(lag_periods, dtype=days.dtype)[:, None]
+    windows = np.asarray(rolling_windows)[:, None]
+    lag_positions = np.searchsorted(
+        days, (pred_days - lags).ravel(), side='right'
+    ).reshape(len(lags), len(pred_days))
+    ends = np.searchsorted(days, pred_days, side='left')
+    
+    # The whole-series statistics are only needed for days without earlier history
+    if fallback is None:
+        if len(ends) and min(ends.min(), lag_positions.min(initial=len(days))) == 0:
+            values = sales.astype(np.float64)
+            fallback = values.mean(), sample_std(values), values.min(), values.max()
+        else:
+            fallback = (np.nan,) * 4
+    series_mean, series_std, series_min, series_max = fallback
+    
+    lag_values = np.where(lag_positions > 0, sales[lag_positions - 1], series_mean)
+    features = {f'{target}_lag_{lag}': lag_values[row] for row, lag in enumerate(lag_periods)}
+    
+    # Observations [first, last) cover every window
+    max_window = max(rolling_windows)
+    first = max(int(ends.min()) - max_window, 0) if len(ends) else 0
+    last = int(ends.max()) if len(ends) else 0
+    values = sales[first:last].astype(np.float64)
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    cumsum_sq = np.concatenate(([0.0], np.cumsum(values * values)))
+    mins, maxs = range_extremes(values, max_window)
+    
+    # One row per window
+    ends = ends - first
+    starts = np.maximum(ends - windows, 0)
+    counts = ends - starts
+    total = cumsum[ends] - cumsum[starts]
+    total_sq = cumsum_sq[ends] - cumsum_sq[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / counts
+        std = np.sqrt(np.maximum((counts * total_sq - total * total) / (counts * (counts - 1)), 0))
+    
+    # Two overlapping power-of-two ranges cover [starts, ends)
+    level = np.frexp(np.maximum(counts, 1))[1] - 1
+    tails = np.maximum(ends - (1 << level), starts)
+    empty = counts == 0
+    stats = {
+        'mean': np.where(empty, series_mean, mean),
+        'std': np.where(empty, series_std, std),
+        'min': np.where(empty, series_min, np.fmin(mins[level, starts], mins[level, tails])),
+        'max': np.where(empty, series_max, np.fmax(maxs[level, starts], maxs[level, tails])),
+    }
+    for row, window in enumerate(rolling_windows):
+        for stat in ROLLING_STATS:
+            features[f'{target}_rolling_{stat}_{window}'] = stats[stat][row]
+    
+    return features
+
+
+def segment_searchsorted(
+    values: np.ndarray,
+    starts: np.ndarray,
+    stops: np.ndarray,
+    targets: np.ndarray
+) -> np.ndarray:
+    """
+    start + np.searchsorted(values[start:stop], target) for many segments at once
+    
+    A binary search over every row in lockstep, so it takes log2(longest
+    segment) array operations instead of one searchsorted call per segment.
+    targets may have extra leading axes, broadcast against starts and stops.
+    """
+    low = np.broadcast_to(starts, targets.shape).astype(np.int64)
+    high = np.broadcast_to(stops, targets.shape).astype(np.int64)
+    last = max(len(values) - 1, 0)
+    while True:
+        active = low < high
+        if not active.any():
+            return low
+        middle = (low + high) >> 1
+        right = active & (values[np.minimum(middle, last)] < targets)
+        low = np.where(right, middle + 1, low)
+        high = np.where(active & ~right, middle, high)
+
+
+def segment_columns(
+    days: np.ndarray,
+    sales: np.ndarray,
+    starts: np.ndarray,
+    stops: np.ndarray,
+    pred_days: np.ndarray,
+    lag_periods: Sequence[int],
+    rolling_windows: Sequence[int],
+    target: str = 'sales'
+) -> Dict[str, np.ndarray]:
+    """
+    Lag and rolling features for many prediction days, each of its own series
+    
+    Row r predicts pred_days[r] from the series days[starts[r]:stops[r]],
+    sales[starts[r]:stops[r]] of concatenated, per-series sorted arrays,
+    with the same definitions as series_columns. Lags and window bounds are
+    one segmented binary search, and the rows' last observations are
+    gathered into one (rows, longest window) matrix whose running sums and
+    extremes give every window, so a batch costs the same few array
+    operations however many series it spans.
+    
+    Args:
+        days: Day numbers of all series, sorted within each series
+        sales: Observations on those days
+        starts, stops: Bounds of each row's series in days and sales
+        pred_days: Day numbers to compute features for
+    """
+    pred_days = np.asarray(pred_days, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    
+    # Lag dates search for the day after, so "on or before" is a left-side search too
+    lags = np.asarray(lag_periods, dtype=np.int64)[:, None]
+    positions = segment_searchsorted(days, starts, stops, np.vstack([pred_days, pred_days - lags + 1]))
+    ends, lag_positions = positions[0], positions[1:]
+    
+    # The whole-series statistics are only needed for rows without earlier history
+    fallback = np.full((4, len(pred_days)), np.nan)
+    needed = (ends == starts) | (lag_positions == starts).any(axis=0)
+    for start, stop in set(zip(starts[needed].tolist(), stops[needed].tolist())):
+        values = sales[start:stop].astype(np.float64)
+        if len(values):
+            rows = needed & (starts == start)
+            fallback[:, rows] = np.array([[values.mean()], [sample_std(values)], [values.min()], [values.max()]])
+    series_mean, series_std, series_min, series_max = fallback
+    
+    lag_values = np.where(lag_positions > starts, sales[np.maximum(lag_positions - 1, 0)], series_mean)
+    features = {f'{target}_lag_{lag}': lag_values[row] for row, lag in enumerate(lag_periods)}
+    
+    # Each row's last observations before its prediction day, newest first
+    positions = ends[:, None] - np.arange(1, max(rolling_windows) + 1)
+    observed = positions >= starts[:, None]
+    recent = np.where(observed, sales[np.maximum(positions, 0)], 0).astype(np.float64)
+    
+    # Column window - 1 of the running reductions covers the last `window` observations
+    windows = np.asarray(rolling_windows)
+    columns = windows - 1
+    counts = np.minimum((ends - starts)[:, None], windows)
+    total = np.cumsum(recent, axis=1)[:, columns]
+    total_sq = np.cumsum(recent * recent, axis=1)[:, columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / counts
+        std = np.sqrt(np.maximum((counts * total_sq - total * total) / (counts * (counts - 1)), 0))
+    
+    empty = counts == 0
+    stats = {
+        'mean': np.where(empty, series_mean[:, None], mean),
+        'std': np.where(empty, series_std[:, None], std),
+        'min': np.where(
+            empty, series_min[:, None],
+            np.minimum.accumulate(np.where(observed, recent, np.inf), axis=1)[:, columns]
+        ),
+        'max': np.where(
+            empty, series_max[:, None],
+            np.maximum.accumulate(np.where(observed, recent, -np.inf), axis=1)[:, columns]
+        ),
+    }
+    for column, window in enumerate(rolling_windows):
+        for stat in ROLLING_STATS:
+            features[f'{target}_rolling_{stat}_{window}'] = stats[stat][:, column]
+    
+    return features
+
+
+class FeatureSpec:
+    """
+    Every model feature, by name and in training column order
+    
+    Features are the item id, calendar features of the prediction date, lags
+    and rolling statistics of the target, and store, item and store-item
+    aggregates of the target.
+    """
+    
+    def __init__(
+        self,
+        lag_periods: Sequence[int] = (1, 3, 7, 14, 30, 60, 90),
+        rolling_windows: Sequence[int] = (7, 14, 30, 60, 90),
+        target: str = 'sales'
+    ):
+        self.lag_periods = list(lag_periods)
+        self.rolling_windows = list(rolling_windows)
+        self.target = target
+    
+    @property
+    def aggregate_features(self) -> List[str]:
+        return [
+            f'store_avg_{self.target}', f'store_std_{self.target}', f'store_median_{self.target}',
+            f'item_avg_{self.target}', f'item_std_{self.target}', f'item_median_{self.target}',
+            f'store_item_avg_{self.target}', f'store_item_std_{self.target}'
+        ]
+    
+    @property
+    def series_features(self) -> List[str]:
+        """Lag and rolling columns, computed per series"""
+        return [
+            *(f'{self.target}_lag_{lag}' for lag in self.lag_periods),
+            *(
+                f'{self.target}_rolling_{stat}_{window}'
+                for window in self.rolling_windows for stat in ROLLING_STATS
+            )
+        ]
+    
+    @property
+    def feature_names(self) -> List[str]:
+        """Model input columns, in order"""
+        return ['item', *TIME_FEATURES, *self.series_features, *self.aggregate_features]
+    
+    def validate(self, names: Iterable[str], source: str) -> None:
+        """
+        Make sure a model or feature list was built from this spec
+        
+        Raises:
+            ValueError: If the names or their order differ
+        """
+        names = list(names)
+        expected = self.feature_names
+        if names == expected:
+            return
+        mismatch = next(
+            (i for i, (name, want) in enumerate(zip(names, expected)) if name != want),
+            min(len(names), len(expected))
+        )
+        found = names[mismatch] if mismatch < len(names) else None
+        wanted = expected[mismatch] if mismatch < len(expected) else None
+        raise ValueError(
+            f"Feature order in {source} does not match the feature spec "
+            f"(column {mismatch}: {found!r}, expected {wanted!r})"
+        )
+    
+    def validate_file(self, feature_names_path: Path) -> bool:
+        """Validate against a pickled feature name list; False if the file does not exist"""
+        if not feature_names_path.exists():
+            return False
+        import joblib
+        self.validate(joblib.load(feature_names_path), feature_names_path.name)
+        return True
+    
+    @property
+    def history_days(self) -> int:
+        """Calendar days of history the longest lag looks back"""
+        return max(self.lag_periods)
+    
+    @property
+    def history_rows(self) -> int:
+        """Observations the longest rolling window looks back"""
+        return max(self.rolling_windows)
+    
+    def series_columns(
+        self,
+        days: np.ndarray,
+        sales: np.ndarray,
+        pred_days: np.ndarray,
+        fallback: Optional[Tuple[float, float, float, float]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Lag and rolling features of one series (see series_columns)"""
+        return series_columns(
+            days, sales, pred_days, self.lag_periods, self.rolling_windows, self.target, fallback
+        )
+    
+    def frame_features(
+        self,
+        df: pd.DataFrame,
+        date_col: str = 'date',
+        store_col: str = 'store',
+        item_col: str = 'item',
+        series_features: Optional[Dict[str, np.ndarray]] = None
+    ) -> pd.DataFrame:
+        """
+        Feature matrix for every row of a sales history frame
+        
+        Each row gets the features the API would compute to predict that
+        row's date from the rows before it, so models trained on this matrix
+        see exactly what they will be served.
+        
+        Args:
+            series_features: Lag and rolling columns for every row, when
+                already computed elsewhere (e.g. in parallel)
+        
+        Returns:
+            DataFrame of feature_names columns, indexed like df
+        """
+        n = len(df)
+        dates = df[date_col].to_numpy(dtype='datetime64[ns]')
+        row_days = dates.astype('datetime64[D]').astype(np.int64)
+        target = df[self.target].to_numpy()
+        stores = df[store_col].to_numpy()
+        items = df[item_col].to_numpy()
+        
+        columns = time_columns(dates)
+        columns['item'] = items.astype(np.float64)
+        columns.update(series_features or {name: np.empty(n) for name in self.series_features})
+        
+        # Lags and rolling windows, one vectorized pass per series
+        groups = {} if series_features else df.groupby([store_col, item_col], sort=False).indices
+        for positions in groups.values():
+            order = positions[np.argsort(row_days[positions], kind='stable')]
+            features = self.series_columns(row_days[order], target[order], row_days[positions])
+            for name, values in features.items():
+                columns[name][positions] = values
+        
+        # Aggregates over the whole frame, as AggregateTable computes them
+        sales = pd.Series(target, index=df.index, dtype=np.float64)
+        for key, prefix, stats in (
+            (stores, 'store', ('mean', 'std', 'median')),
+            (items, 'item', ('mean', 'std', 'median')),
+            ([stores, items], 'store_item', ('mean', 'std'))
+        ):
+            grouped = sales.groupby(key)
+            for stat in stats:
+                name = 'avg' if stat == 'mean' else stat
+                columns[f'{prefix}_{name}_{self.target}'] = grouped.transform(stat).to_numpy()
+        
+        return pd.DataFrame({name: columns[name] for name in self.feature_names}, index=df.index)
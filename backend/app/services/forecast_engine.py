@@ -0,0 +1,192 @@
+"""
+Recursive multi-day forecast engine
+"""
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from app.models.aggregates import AggregateTable
+from app.models.series_index import SeriesIndex, day_number
+from app.services.feature_engineering import FEATURE_ORDER, feature_engineer
+from app.services.feature_spec import sample_std
+
+
+class ForecastState:
+    """
+    Lag and rolling-window state for a set of series, advanced one day at a time
+    
+    Two ring buffers hold the last `capacity` values of every series, each
+    followed by the predictions pushed so far. Lags read the daily buffer, which
+    is the history forward-filled onto a calendar grid ending on the base date.
+    Rolling windows read the observed buffer, which holds the last observations
+    themselves. The two buffers only differ when the history has gaps.
+    
+    Rolling sums, sums of squares and counts are updated in O(1) per step.
+    Minima and maxima are also updated in O(1), except when the value leaving a
+    window was its extreme; only those series' windows are rescanned.
+    """
+    
+    def __init__(
+        self,
+        histories: List[Tuple[np.ndarray, np.ndarray]],
+        base_day: int,
+        lag_periods: list,
+        rolling_windows: list
+    ):
+        self.lag_periods = list(lag_periods)
+        self.rolling_windows = list(rolling_windows)
+        self.capacity = max(self.lag_periods + self.rolling_windows)
+        self.head = self.capacity - 1  # Slot of the most recent day
+        
+        # Daily grid ending on the base date; days before the first observation stay NaN
+        grid = base_day - np.arange(self.capacity - 1, -1, -1)
+        self.daily = np.full((len(histories), self.capacity), np.nan)
+        self.observed = np.full((len(histories), self.capacity), np.nan)
+        self.fallback = np.empty((len(histories), 4))  # mean, std, min, max of full history
+        
+        for row, (days, sales) in enumerate(histories):
+            values = sales.astype(np.float64)
+            positions = np.searchsorted(days, grid, side='right')
+            self.daily[row] = np.where(positions > 0, values[positions - 1], np.nan)
+            observed = values[:positions[-1]][-self.capacity:]
+            self.observed[row, self.capacity - len(observed):] = observed
+            self.fallback[row] = (values.mean(), sample_std(values), values.min(), values.max())
+        
+        self.sums: Dict[int, np.ndarray] = {}
+        self.sums_sq: Dict[int, np.ndarray] = {}
+        self.counts: Dict[int, np.ndarray] = {}
+        self.mins: Dict[int, np.ndarray] = {}
+        self.maxs: Dict[int, np.ndarray] = {}
+        for window in self.rolling_windows:
+            recent = self.recent(window)
+            self.counts[window] = (~np.isnan(recent)).sum(axis=1)
+            self.sums[window] = np.nansum(recent, axis=1)
+            self.sums_sq[window] = np.nansum(recent * recent, axis=1)
+            self.mins[window] = np.fmin.reduce(recent, axis=1)
+            self.maxs[window] = np.fmax.reduce(recent, axis=1)
+    
+    def recent(self, window: int) -> np.ndarray:
+        """Last `window` observed values for every series, most recent first"""
+        slots = (self.head - np.arange(window)) % self.capacity
+        return self.observed[:, slots]
+    
+    def features(self) -> Dict[str, np.ndarray]:
+        """Lag and rolling features for the day after the most recent one"""
+        mean_fallback, std_fallback, min_fallback, max_fallback = self.fallback.T
+        features = {}
+        
+        for lag in self.lag_periods:
+            value = self.daily[:, (self.head - lag + 1) % self.capacity]
+            features[f'sales_lag_{lag}'] = np.where(np.isnan(value), mean_fallback, value)
+        
+        for window in self.rolling_windows:
+            counts = self.counts[window]
+            total = self.sums[window]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = total / counts
+                variance = (counts * self.sums_sq[window] - total * total) / (counts * (counts - 1))
+            empty = counts == 0
+            features[f'sales_rolling_mean_{window}'] = np.where(empty, mean_fallback, mean)
+            features[f'sales_rolling_std_{window}'] = np.where(
+                empty, std_fallback, np.sqrt(np.maximum(variance, 0))
+            )
+            features[f'sales_rolling_min_{window}'] = np.where(empty, min_fallback, self.mins[window])
+            features[f'sales_rolling_max_{window}'] = np.where(empty, max_fallback, self.maxs[window])
+        
+        return features
+    
+    def push(self, values: np.ndarray) -> None:
+        """Append one day of values (e.g. predictions) to every series"""
+        head = (self.head + 1) % self.capacity
+        stale = []
+        
+        for window in self.rolling_windows:
+            # Day leaving the window; for the widest window it is the slot being overwritten
+            outgoing = self.observed[:, (head - window) % self.capacity]
+            valid = ~np.isnan(outgoing)
+            removed = np.where(valid, outgoing, 0.0)
+            
+            self.sums[window] += values - removed
+            self.sums_sq[window] += values * values - removed * removed
+            self.counts[window] += 1 - valid
+            
+            stale.append((window, valid & ((outgoing == self.mins[window]) | (outgoing == self.maxs[window]))))
+            self.mins[window] = np.fmin(self.mins[window], values)
+            self.maxs[window] = np.fmax(self.maxs[window], values)
+        
+        self.daily[:, head] = values
+        self.observed[:, head] = values
+        self.head = head
+        
+        # Rescan only the windows whose extreme just dropped out
+        for window, rows in stale:
+            if rows.any():
+                recent = self.recent(window)[rows]
+                self.mins[window][rows] = np.fmin.reduce(recent, axis=1)
+                self.maxs[window][rows] = np.fmax.reduce(recent, axis=1)
+
+
+class RecursiveForecaster:
+    """Forecasts store-item series day by day, feeding predictions back as history"""
+    
+    @staticmethod
+    def forecast(
+        series_keys: List[Tuple[int, int]],
+        base_date: pd.Timestamp,
+        days: int,
+        series_index: SeriesIndex,
+        aggregates: AggregateTable,
+        predict: Callable[[np.ndarray], np.ndarray],
+        lag_periods: list,
+        rolling_windows: list
+    ) -> np.ndarray:
+        """
+        Forecast the days after `base_date` for several series in lockstep
+        
+        Only history up to the base date is used; every later day's lags and
+        rolling windows come from earlier predictions. Each day is scored with
+        one model call covering all series.
+        
+        Returns:
+            Array of shape (len(series_keys), days) with predicted sales
+        """
+        histories = []
+        for store, item in series_keys:
+            series = series_index.get(store, item)
+            if series is None or len(series[0]) == 0:
+                raise ValueError(f"No historical data for store {store}, item {item}")
+            histories.append(series)
+        
+        base = pd.Timestamp(base_date).normalize()
+        state = ForecastState(histories, int(day_number(base)), lag_periods, rolling_windows)
+        
+        column = {name: i for i, name in enumerate(FEATURE_ORDER)}
+        
+        # Per-series columns stay fixed for the whole horizon
+        stores = [store for store, _ in series_keys]
+        items = [item for _, item in series_keys]
+        template = np.empty((len(series_keys), len(FEATURE_ORDER)))
+        static_columns = feature_engineer.create_aggregate_columns(stores, items, aggregates)
+        static_columns['item'] = np.asarray(items, dtype=np.float64)
+        for name, values in static_columns.items():
+            template[:, column[name]] = values
+        
+        forecast_dates = (base + pd.to_timedelta(np.arange(1, days + 1), unit='D')).to_numpy()
+        time_columns = feature_engineer.create_time_columns(forecast_dates)
+        
+        predictions = np.empty((len(series_keys), days))
+        for step in range(days):
+            features = template.copy()
+            for name, values in time_columns.items():
+                features[:, column[name]] = values[step]
+            for name, values in state.features().items():
+                features[:, column[name]] = values
+            
+            predictions[:, step] = predict(features)
+            state.push(predictions[:, step])
+        
+        return predictions
+
+
+# Global forecaster instance
+recursive_forecaster = RecursiveForecaster()
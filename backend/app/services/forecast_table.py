@@ -0,0 +1,214 @@
+"""
+Materialized next-N-days predictions for every store-item series
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from app.models.model_loader import model_manager, ServingState
+from app.models.series_index import day_number
+from app.services.feature_engineering import feature_engineer
+from app.services.forecast_engine import recursive_forecaster
+from app.core.config import LAG_PERIODS, ROLLING_WINDOWS, MAX_FORECAST_DAYS
+
+
+class MaterializedForecasts:
+    """
+    Predictions for the `days` after the last data date, one row per series
+    
+    `recursive` holds the /forecast results, where each day's prediction feeds
+    the next day's features. `direct` holds the /predict results, where every
+    day is scored from the history alone. Both keep the scorer's output dtype
+    (float32 for the tree models, float64 for linear and some compiled
+    models), so lookups return exactly what on-demand scoring would.
+    """
+    
+    def __init__(
+        self,
+        version: int,
+        base_day: int,
+        keys: List[Tuple[int, int]],
+        recursive: np.ndarray,
+        direct: np.ndarray
+    ):
+        self.version = version
+        self.base_day = base_day
+        self.days = recursive.shape[1]
+        self.rows: Dict[Tuple[int, int], int] = {key: row for row, key in enumerate(keys)}
+        self.recursive = recursive
+        self.direct = direct
+    
+    def offset(self, day: int) -> Optional[int]:
+        """Column of a day in the table, or None outside the materialized window"""
+        position = day - self.base_day - 1
+        return position if 0 <= position < self.days else None
+
+
+class ForecastMaterializer:
+    """
+    Builds the forecast table for the current model/data version and serves lookups
+    
+    Tables are kept per version: a reload prepares the next version's table
+    while requests pinned to the current one keep using theirs, and a build
+    that finishes after a newer version was published is dropped.
+    """
+    
+    def __init__(self, days: int):
+        self.days = days
+        self.tables: Dict[int, MaterializedForecasts] = {}
+        self._lock = threading.Lock()  # Serializes swapping in tables
+    
+    def _current(self, version: int) -> Optional[MaterializedForecasts]:
+        """The table, if one was built from the model and data of the given version"""
+        return self.tables.get(version)
+    
+    def _store(self, table: MaterializedForecasts) -> bool:
+        """Swap in a table unless its version is older than the published state"""
+        with self._lock:
+            published = model_manager.state.version
+            if table.version < published:
+                return False
+            # Replaced, not mutated, so lookups never lock
+            tables = {version: kept for version, kept in self.tables.items() if version >= published}
+            tables[table.version] = table
+            self.tables = tables
+            return True
+    
+    def build(self, state: Optional[ServingState] = None) -> MaterializedForecasts:
+        """Score every series for the next `days` days, in lockstep, in a few model calls"""
+        state = state or model_manager.state
+        snapshot = state.snapshot
+        keys = sorted(snapshot.series_index.offsets)
+        base_date = snapshot.max_date
+        
+        recursive = recursive_forecaster.forecast(
+            series_keys=keys,
+            base_date=base_date,
+            days=self.days,
+            series_index=snapshot.series_index,
+            aggregates=snapshot.aggregates,
+            predict=state.predict_batch,
+            lag_periods=LAG_PERIODS,
+            rolling_windows=ROLLING_WINDOWS
+        )
+        
+        # Series-major request order, so row r covers keys[r // days]
+        dates = pd.date_range(base_date, periods=self.days + 1, freq='D')[1:].strftime('%Y-%m-%d')
+        requests = [(store, item, date) for store, item in keys for date in dates]
+        features, _ = feature_engineer.prepare_features_batch(
+            requests=requests,
+            series_index=snapshot.series_index,
+            aggregates=snapshot.aggregates,
+            lag_periods=LAG_PERIODS,
+            rolling_windows=ROLLING_WINDOWS
+        )
+        direct = state.predict_batch(features).reshape(len(keys), self.days)
+        
+        return MaterializedForecasts(
+            version=state.version,
+            base_day=int(day_number(base_date)),
+            keys=keys,
+            recursive=np.asarray(recursive),
+            direct=np.asarray(direct)
+        )
+    
+    def refresh(self, state: Optional[ServingState] = None) -> bool:
+        """
+        Rebuild the table and swap it in
+        
+        Passed as ModelManager.reload's `prepare`, the table for a new state is
+        ready by the time that state is published.
+        """
+        try:
+            start = time.perf_counter()
+            table = self.build(state)
+            if not self._store(table):
+                print(f"⚠ Discarded forecasts for version {table.version}, a newer version is being served")
+                return False
+            print(
+                f"✓ Materialized {self.days}-day forecasts for {len(table.rows)} series "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            return True
+        except Exception as e:
+            print(f"✗ Failed to materialize forecasts: {e}")
+            return False
+    
+    async def watch(self, interval_seconds: float) -> None:
+        """Rebuild off the event loop whenever a new model or data version is loaded"""
+        loop = asyncio.get_running_loop()
+        built_version = None
+        while True:
+            state = model_manager.state
+            if state.version != built_version and state.is_ready():
+                # A reload may already have built it before publishing, and a
+                # reload during the build makes it stale (refresh drops it)
+                if self._current(state.version) is None:
+                    await loop.run_in_executor(None, self.refresh, state)
+                built_version = state.version
+                if model_manager.state.version != built_version:
+                    continue
+            await asyncio.sleep(interval_seconds)
+    
+    def lookup_prediction(self, store: int, item: int, day: int, version: int) -> Optional[float]:
+        """Materialized /predict result for a day number, or None if it must be computed"""
+        table = self._current(version)
+        if table is None:
+            return None
+        row = table.rows.get((store, item))
+        column = table.offset(day)
+        if row is None or column is None:
+            return None
+        return float(table.direct[row, column])
+    
+    def lookup_forecast(
+        self,
+        store: int,
+        item: int,
+        base_date: pd.Timestamp,
+        days: int,
+        version: int
+    ) -> Optional[np.ndarray]:
+        """Materialized /forecast results after base_date, or None if they must be computed"""
+        table = self._current(version)
+        if table is None or days > table.days:
+            return None
+        row = table.rows.get((store, item))
+        if row is None or int(day_number(pd.Timestamp(base_date).normalize())) != table.base_day:
+            return None
+        return table.recursive[row, :days]
+    
+    def lookup_grid(
+        self,
+        keys: List[Tuple[int, int]],
+        first_day: int,
+        days: int,
+        version: int,
+        recursive: bool = True
+    ) -> Optional[np.ndarray]:
+        """
+        Materialized results for several series and consecutive days, or None
+        
+        Recursive results only match when the days start right after the data;
+        direct results can be any days inside the materialized window.
+        """
+        table = self._current(version)
+        if table is None:
+            return None
+        start = table.offset(first_day)
+        if start is None or table.offset(first_day + days - 1) is None:
+            return None
+        if recursive and start != 0:
+            return None
+        rows = [table.rows.get(key) for key in keys]
+        if None in rows:
+            return None
+        matrix = table.recursive if recursive else table.direct
+        return matrix[rows, start:start + days]
+
+
+# Global forecast materializer instance
+forecast_materializer = ForecastMaterializer(days=MAX_FORECAST_DAYS)
@@ -2,9 +2,18 @@
 Prediction service for business logic
 """
 import numpy as np
-from typing import Dict
-from app.models.model_loader import model_manager
+import pandas as pd
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from app.models.model_loader import model_manager, ServingState
+from app.models.series_index import day_number
 from app.services.feature_engineering import feature_engineer
+from app.services.feature_spec import sample_std
+from app.services.forecast_engine import recursive_forecaster
+from app.services.forecast_table import forecast_materializer
+from app.core.cache import prediction_cache
+from app.core.metrics import metrics
 from app.core.config import (
     SAFETY_STOCK_PERCENTAGE,
     CONFIDENCE_INTERVAL,
@@ -13,11 +22,24 @@ from app.core.config import (
 )
 
 
+class InvalidDateError(ValueError):
+    """Raised when a prediction date cannot be parsed (answered with 400)"""
+    
+    status_code = 400
+
+
 class PredictionService:
     """Handles prediction business logic"""
     
     @staticmethod
-    def predict_sales(store: int, item: int, date: str) -> Dict:
+    def predict_sales(
+        store: int,
+        item: int,
+        date: str,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None,
+        state: Optional[ServingState] = None
+    ) -> Dict:
         """
         Make sales prediction and calculate inventory recommendations
         
@@ -25,28 +47,240 @@ class PredictionService:
             store: Store ID
             item: Item ID
             date: Prediction date in YYYY-MM-DD format
+            model: Registered model to use (default model if omitted)
+            weights: Weighted ensemble of registered models, instead of `model`
+            state: Models and data to use (default: those currently served)
             
         Returns:
             Dictionary with prediction results
         """
-        if not model_manager.is_ready():
+        state = state or model_manager.state
+        if not state.is_ready():
             raise ValueError("Model or data not loaded")
+        snapshot = state.snapshot
+        members = state.registry.resolve(model, weights)
+        try:
+            # Accepts dates without zero padding (e.g. 2014-5-1), like the request validator
+            pred_day = int(day_number(pd.Timestamp(date)))
+        except ValueError:
+            raise InvalidDateError(f"Invalid date: {date}")
+        
+        # Default-model dates in the materialized window are a table lookup
+        if members == state.registry.resolve():
+            with metrics.stage("table_lookup"):
+                predicted_sales = forecast_materializer.lookup_prediction(store, item, pred_day, state.version)
+            if predicted_sales is not None:
+                _, std_error = snapshot.aggregates.store_item(store, item)
+                return PredictionService.build_result(predicted_sales, std_error)
+        
+        # Results only change when the model or data is reloaded
+        cache_key = (store, item, date, members, state.version)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
         
         # Prepare features
-        features, store_item_data = feature_engineer.prepare_features(
+        with metrics.stage("history_lookup"):
+            series = snapshot.series_index.get(store, item)
+        features, _ = feature_engineer.prepare_features(
             store=store,
             item=item,
             date=date,
-            all_data=model_manager.data,
+            series=series,
+            aggregates=snapshot.aggregates,
             lag_periods=LAG_PERIODS,
             rolling_windows=ROLLING_WINDOWS
         )
         
         # Make prediction
-        predicted_sales = model_manager.predict(features)
+        predicted_sales = state.predict(features, model=model, weights=weights)
+        
+        _, std_error = snapshot.aggregates.store_item(store, item)
+        result = PredictionService.build_result(predicted_sales, std_error)
+        prediction_cache.put(cache_key, result)
+        return dict(result)
+    
+    @staticmethod
+    def predict_batch(
+        requests: List[Tuple[int, int, str]],
+        selections: Optional[List[Tuple[Optional[str], Optional[Dict[str, float]]]]] = None,
+        state: Optional[ServingState] = None
+    ) -> List[Optional[Dict]]:
+        """
+        Make predictions for many (store, item, date) requests with one call per model
+        
+        Args:
+            requests: (store, item, date) tuples
+            selections: (model, ensemble weights) per request (default model if omitted)
+            state: Models and data to use (default: those currently served)
+        
+        Returns:
+            Prediction results in request order, None for requests without history
+        """
+        state = state or model_manager.state
+        if not state.is_ready():
+            raise ValueError("Model or data not loaded")
+        snapshot = state.snapshot
+        
+        features, found = feature_engineer.prepare_features_batch(
+            requests=requests,
+            series_index=snapshot.series_index,
+            aggregates=snapshot.aggregates,
+            lag_periods=LAG_PERIODS,
+            rolling_windows=ROLLING_WINDOWS
+        )
+        
+        results: List[Optional[Dict]] = [None] * len(requests)
+        if not found.any():
+            return results
+        
+        # Feature rows (one per request with history) asking for the same
+        # model or ensemble share one scoring call
+        positions = np.flatnonzero(found)
+        groups = defaultdict(list)
+        for row, position in enumerate(positions.tolist()):
+            model, weights = selections[position] if selections else (None, None)
+            groups[state.registry.resolve(model, weights)].append(row)
+        
+        predictions = np.empty(len(positions))
+        for members, rows in groups.items():
+            group_features = features if len(rows) == len(features) else features[rows]
+            predictions[rows] = state.predict_batch(group_features, weights=dict(members))
+        
+        stores, items, _ = zip(*requests)
+        std_errors = snapshot.aggregates.store_items(np.asarray(stores)[found], np.asarray(items)[found])[:, 1]
+        rows = PredictionService.build_result_rows(predictions, std_errors)
+        for position, result in zip(positions.tolist(), rows):
+            results[position] = result
+        
+        return results
+    
+    @staticmethod
+    def forecast_sales(
+        store: int,
+        item: int,
+        base_date: pd.Timestamp,
+        days: int,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None,
+        state: Optional[ServingState] = None
+    ) -> List[Dict]:
+        """
+        Recursively forecast the days after base_date for a store-item
+        
+        Returns:
+            One prediction result per day, each with its date
+        """
+        state = state or model_manager.state
+        if not state.is_ready():
+            raise ValueError("Model or data not loaded")
+        snapshot = state.snapshot
+        members = state.registry.resolve(model, weights)
+        
+        predictions = None
+        if members == state.registry.resolve():
+            predictions = forecast_materializer.lookup_forecast(store, item, base_date, days, state.version)
+        if predictions is None:
+            predictions = recursive_forecaster.forecast(
+                series_keys=[(store, item)],
+                base_date=base_date,
+                days=days,
+                series_index=snapshot.series_index,
+                aggregates=snapshot.aggregates,
+                predict=partial(state.predict_batch, weights=dict(members)),
+                lag_periods=LAG_PERIODS,
+                rolling_windows=ROLLING_WINDOWS
+            )[0]
+        
+        _, std_error = snapshot.aggregates.store_item(store, item)
+        forecast_dates = pd.date_range(pd.Timestamp(base_date).normalize(), periods=days + 1, freq='D')[1:]
+        return [
+            {'date': forecast_date, **PredictionService.build_result(predicted_sales, std_error)}
+            for forecast_date, predicted_sales in zip(
+                forecast_dates.strftime('%Y-%m-%d'), predictions.tolist()
+            )
+        ]
+    
+    @staticmethod
+    def forecast_grid(
+        stores: List[int],
+        items: List[int],
+        first_date: pd.Timestamp,
+        days: int,
+        model: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None,
+        recursive: bool = True,
+        state: Optional[ServingState] = None
+    ) -> Dict:
+        """
+        Forecast every store × item series for `days` consecutive dates at once
+        
+        Args:
+            first_date: First forecast date
+            recursive: Feed each day's predictions into the next day's features
+                (as /forecast does, one model call per day for all series);
+                otherwise score every date from the history alone (as /predict
+                does, one feature tensor in a single model call)
+        
+        Returns:
+            Series with history and those without, the forecast dates, and one
+            (series, days) matrix per prediction result field
+        """
+        state = state or model_manager.state
+        if not state.is_ready():
+            raise ValueError("Model or data not loaded")
+        snapshot = state.snapshot
+        members = state.registry.resolve(model, weights)
+        predict = partial(state.predict_batch, weights=dict(members))
+        
+        keys = [(store, item) for store in stores for item in items]
+        series = [key for key in keys if key in snapshot.series_index.offsets]
+        missing = [key for key in keys if key not in snapshot.series_index.offsets]
+        first_date = pd.Timestamp(first_date).normalize()
+        dates = pd.date_range(first_date, periods=days, freq='D')
+        
+        predictions = None
+        if members == state.registry.resolve():
+            predictions = forecast_materializer.lookup_grid(
+                series, int(day_number(first_date)), days, state.version, recursive
+            )
+        if predictions is None and not series:
+            predictions = np.empty((0, days))
+        elif predictions is None and recursive:
+            predictions = recursive_forecaster.forecast(
+                series_keys=series,
+                base_date=first_date - pd.Timedelta(days=1),
+                days=days,
+                series_index=snapshot.series_index,
+                aggregates=snapshot.aggregates,
+                predict=predict,
+                lag_periods=LAG_PERIODS,
+                rolling_windows=ROLLING_WINDOWS
+            )
+        elif predictions is None:
+            # Series-major rows, so row r covers series[r // days]
+            date_strings = dates.strftime('%Y-%m-%d')
+            features, _ = feature_engineer.prepare_features_batch(
+                requests=[(store, item, date) for store, item in series for date in date_strings],
+                series_index=snapshot.series_index,
+                aggregates=snapshot.aggregates,
+                lag_periods=LAG_PERIODS,
+                rolling_windows=ROLLING_WINDOWS
+            )
+            predictions = predict(features).reshape(len(series), days)
         
+        std_errors = snapshot.aggregates.store_items(*np.array(series, dtype=np.int64).reshape(-1, 2).T)[:, 1]
+        return {
+            'series': series,
+            'missing': missing,
+            'dates': dates.strftime('%Y-%m-%d').tolist(),
+            **PredictionService.build_results(predictions, std_errors)
+        }
+    
+    @staticmethod
+    def build_result(predicted_sales: float, std_error: float) -> Dict:
+        """Calculate confidence interval and inventory recommendation for a prediction"""
         # Calculate confidence interval
-        std_error = store_item_data['sales'].std()
         confidence_lower = max(0, predicted_sales - CONFIDENCE_INTERVAL * std_error)
         confidence_upper = predicted_sales + CONFIDENCE_INTERVAL * std_error
         
@@ -62,37 +296,83 @@ class PredictionService:
         }
     
     @staticmethod
-    def get_analytics(store: int, item: int, days: int = 90) -> Dict:
+    def build_result_rows(predicted_sales: np.ndarray, std_errors: np.ndarray) -> List[Dict]:
+        """build_result for many predictions at once, each with its own standard error"""
+        predicted_sales = np.asarray(predicted_sales, dtype=np.float64)
+        std_errors = np.asarray(std_errors, dtype=np.float64)
+        confidence_lower = predicted_sales - CONFIDENCE_INTERVAL * std_errors
+        confidence_lower = np.where(confidence_lower > 0, confidence_lower, 0)  # max(0, x), NaN included
+        confidence_upper = predicted_sales + CONFIDENCE_INTERVAL * std_errors
+        safety_stock = predicted_sales * SAFETY_STOCK_PERCENTAGE
+        recommended_inventory = np.ceil(predicted_sales + safety_stock).astype(np.int64)
+        
+        # Python's round, so values match build_result exactly
+        return [
+            {
+                'predicted_sales': round(sales, 2),
+                'recommended_inventory': inventory,
+                'confidence_lower': round(lower, 2),
+                'confidence_upper': round(upper, 2)
+            }
+            for sales, inventory, lower, upper in zip(
+                predicted_sales.tolist(), recommended_inventory.tolist(),
+                confidence_lower.tolist(), confidence_upper.tolist()
+            )
+        ]
+    
+    @staticmethod
+    def build_results(predicted_sales: np.ndarray, std_errors: np.ndarray) -> Dict[str, np.ndarray]:
+        """build_result for a (series, days) matrix, with one standard error per series"""
+        predicted_sales = np.asarray(predicted_sales, dtype=np.float64)
+        std_errors = np.asarray(std_errors, dtype=np.float64).reshape(-1, 1)
+        confidence_lower = np.maximum(0, predicted_sales - CONFIDENCE_INTERVAL * std_errors)
+        confidence_upper = predicted_sales + CONFIDENCE_INTERVAL * std_errors
+        safety_stock = predicted_sales * SAFETY_STOCK_PERCENTAGE
+        
+        return {
+            'predicted_sales': np.round(predicted_sales, 2),
+            'recommended_inventory': np.ceil(predicted_sales + safety_stock).astype(np.int64),
+            'confidence_lower': np.round(confidence_lower, 2),
+            'confidence_upper': np.round(confidence_upper, 2)
+        }
+    
+    @staticmethod
+    def get_analytics(
+        store: int,
+        item: int,
+        days: int = 90,
+        state: Optional[ServingState] = None
+    ) -> Dict:
         """Get historical analytics for a store-item combination"""
-        if model_manager.data is None:
+        snapshot = (state or model_manager.state).snapshot
+        if snapshot is None:
             raise ValueError("Data not loaded")
         
-        # Filter data
-        store_item_data = model_manager.data[
-            (model_manager.data['store'] == store) & 
-            (model_manager.data['item'] == item)
-        ].copy()
+        # Look up the store-item history (views, no copy)
+        series = snapshot.series_index.get(store, item)
         
-        if len(store_item_data) == 0:
+        if series is None or len(series[0]) == 0:
             raise ValueError(f"No data found for store {store}, item {item}")
         
         # Get recent data
-        recent_data = store_item_data.tail(days)
+        recent_days = series[0][-days:]
+        recent_sales = series[1][-days:]
         
         # Calculate statistics
         statistics = {
-            'mean_sales': float(recent_data['sales'].mean()),
-            'median_sales': float(recent_data['sales'].median()),
-            'std_sales': float(recent_data['sales'].std()),
-            'min_sales': float(recent_data['sales'].min()),
-            'max_sales': float(recent_data['sales'].max()),
-            'total_sales': float(recent_data['sales'].sum())
+            'mean_sales': float(recent_sales.mean()),
+            'median_sales': float(np.median(recent_sales)),
+            'std_sales': float(sample_std(recent_sales)),
+            'min_sales': float(recent_sales.min()),
+            'max_sales': float(recent_sales.max()),
+            'total_sales': float(recent_sales.sum())
         }
         
         # Determine trend
-        if len(recent_data) >= 30:
-            first_half = recent_data.head(len(recent_data) // 2)['sales'].mean()
-            second_half = recent_data.tail(len(recent_data) // 2)['sales'].mean()
+        if len(recent_sales) >= 30:
+            half = len(recent_sales) // 2
+            first_half = recent_sales[:half].mean()
+            second_half = recent_sales[-half:].mean()
             
             if second_half > first_half * 1.1:
                 trend = "increasing"
@@ -104,9 +384,13 @@ class PredictionService:
             trend = "insufficient_data"
         
         # Convert to list of dicts
-        historical_data = recent_data[['date', 'sales']].to_dict('records')
-        for record in historical_data:
-            record['date'] = record['date'].strftime('%Y-%m-%d')
+        historical_data = [
+            {'date': date, 'sales': sales}
+            for date, sales in zip(
+                np.datetime_as_string(recent_days.astype('datetime64[D]')).tolist(),
+                recent_sales.tolist()
+            )
+        ]
         
         return {
             'historical_data': historical_data,
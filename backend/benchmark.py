@@ -0,0 +1,259 @@
+"""
+Benchmark the prediction API and the training feature pipeline
+
+Drives the FastAPI app in-process through an ASGI client (no server, no
+network) over a synthetic data set in the Kaggle shape, then times the src
+training feature functions on the same data. Each scenario reports p50, p95
+and p99 latency, throughput and peak traced memory, and the results are
+saved as JSON so runs can be compared between commits:
+
+    cd backend
+    python benchmark.py --output baseline.json
+    python benchmark.py --output after.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.core.config import BASE_DIR, MODEL_PATHS, SCALED_MODELS, SCALER_PATH, MAX_BATCH_SIZE
+
+sys.path.insert(0, str(BASE_DIR))  # For the src training utilities
+
+
+def summarize(latencies: List[float], elapsed: float, peak_bytes: Optional[int]) -> Dict:
+    """Latency percentiles (ms), throughput (calls/s) and peak traced memory (MB)"""
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 2),
+        'peak_mb': round(peak_bytes / 1e6, 2) if peak_bytes is not None else None,
+    }
+
+
+async def run_requests(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Dict],
+    calls: int,
+    concurrency: int
+) -> Dict:
+    """
+    Send `calls` requests from `concurrency` concurrent workers, then a
+    few more under tracemalloc for peak memory (tracing slows every
+    allocation, so it is kept out of the timed pass)
+    """
+    latencies: List[float] = []
+    
+    async def worker(indices: range) -> None:
+        for index in indices:
+            start = time.perf_counter()
+            response = await client.request(**make_request(index))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} from {response.request.url}: {response.text[:200]}")
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(range(i, calls, concurrency)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    tracemalloc.start()
+    for index in range(min(calls, 3)):
+        await client.request(**make_request(calls + index))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    return summarize(latencies, elapsed, peak)
+
+
+def run_calls(func: Callable[[], object], calls: int) -> Dict:
+    """Time a function `calls` times, the last call under tracemalloc"""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(calls):
+        call_start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(latencies, elapsed, peak)
+
+
+async def benchmark_api(data_dir: Path, args: argparse.Namespace) -> Dict[str, Dict]:
+    """Load the models and the synthetic data into the app and time every endpoint scenario"""
+    from app.main import app
+    from app.models.model_loader import model_manager
+    from app.core.cache import prediction_cache
+    from app.services.forecast_table import forecast_materializer
+    
+    model_manager.load_models(MODEL_PATHS, SCALED_MODELS, SCALER_PATH)
+    if not model_manager.load_data(data_dir):
+        raise RuntimeError(f"Could not load {data_dir}")
+    if args.materialize:
+        forecast_materializer.refresh()
+    
+    # Random dates within the last year of history, so few requests repeat
+    last_day = model_manager.snapshot.max_date
+    
+    def random_request(index: int) -> Dict:
+        request_rng = np.random.default_rng([args.seed, index])
+        date = last_day - np.timedelta64(int(request_rng.integers(0, 365)), 'D')
+        return {
+            'store': int(request_rng.integers(1, 11)),
+            'item': int(request_rng.integers(1, 51)),
+            'date': date.strftime('%Y-%m-%d'),
+        }
+    
+    scenarios = {
+        'predict': lambda i: {'method': 'POST', 'url': '/predict', 'json': random_request(i)},
+        'analytics': lambda i: {'method': 'GET', 'url': "/analytics/{store}/{item}".format(**random_request(i))},
+    }
+    for size in sorted({1, 10, MAX_BATCH_SIZE}):
+        scenarios[f'batch_predict_{size}'] = lambda i, size=size: {
+            'method': 'POST', 'url': '/batch-predict',
+            'json': {'predictions': [random_request(i * size + j) for j in range(size)]}
+        }
+    for size in (1000, 10000):
+        scenarios[f'batch_predict_stream_{size}'] = lambda i, size=size: {
+            'method': 'POST', 'url': '/batch-predict/stream',
+            'content': "".join(json.dumps(random_request(i * size + j)) + "\n" for j in range(size)),
+            'headers': {'Content-Type': 'application/x-ndjson'},
+        }
+    for days in (7, 30):
+        scenarios[f'forecast_{days}'] = lambda i, days=days: {
+            'method': 'GET', 'url': "/forecast/{store}/{item}".format(**random_request(i)), 'params': {'days': days}
+        }
+    
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, make_request in scenarios.items():
+            calls = max(args.calls // 100, 3) if 'stream' in name else args.calls
+            prediction_cache.invalidate()  # Every scenario starts cold
+            results[name] = await run_requests(client, make_request, calls, args.concurrency)
+            print(f"✓ {name}: p50 {results[name]['p50_ms']} ms, p99 {results[name]['p99_ms']} ms")
+    return results
+
+
+def benchmark_features(args: argparse.Namespace) -> Dict[str, Dict]:
+    """Time the src training feature functions on a synthetic history"""
+    from src.synthetic_data import generate_sales_data
+    from src.data_processing import (
+        create_time_features,
+        create_lag_features,
+        create_rolling_features,
+        create_model_features
+    )
+    
+    df = generate_sales_data(years=args.years, seed=args.seed)
+    scenarios = {
+        'create_time_features': lambda: create_time_features(df),
+        'create_lag_features': lambda: create_lag_features(df, 'sales', ['store', 'item'], [1, 7, 30]),
+        'create_rolling_features': lambda: create_rolling_features(
+            df, 'sales', ['store', 'item'], [7, 30, 90], stats=('mean', 'std', 'min', 'max')
+        ),
+        'create_model_features': lambda: create_model_features(df),
+    }
+    
+    results = {}
+    for name, func in scenarios.items():
+        results[name] = run_calls(func, args.feature_calls)
+        print(f"✓ {name} ({len(df)} rows): p50 {results[name]['p50_ms']} ms")
+    return results
+
+
+def environment() -> Dict:
+    """What the numbers were measured on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(results: Dict, baseline: Dict) -> None:
+    """Print p50/p99 changes of every scenario against a baseline run"""
+    print(f"\nCompared with {baseline['environment'].get('commit')}:")
+    print(f"{'scenario':<28}{'p50 ms':>12}{'change':>9}{'p99 ms':>12}{'change':>9}")
+    for section in ('api', 'features'):
+        for name, current in results[section].items():
+            previous = baseline.get(section, {}).get(name)
+            if previous is None:
+                continue
+            changes = [
+                f"{(current[key] / previous[key] - 1) * 100:+.0f}%" if previous[key] else "n/a"
+                for key in ('p50_ms', 'p99_ms')
+            ]
+            print(f"{name:<28}{current['p50_ms']:>12.2f}{changes[0]:>9}{current['p99_ms']:>12.2f}{changes[1]:>9}")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process, where the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1e6 if sys.platform == 'darwin' else 1e3), 1)  # Bytes on macOS, KiB elsewhere
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200, help="Requests per API scenario")
+    parser.add_argument('--feature-calls', type=int, default=3, help="Runs per feature function")
+    parser.add_argument('--concurrency', type=int, default=1, help="Concurrent API clients")
+    parser.add_argument('--years', type=int, default=5, help="Years of synthetic history")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--materialize', action='store_true', help="Build the forecast table first")
+    parser.add_argument('--skip-features', action='store_true', help="Only benchmark the API")
+    parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'))
+    parser.add_argument('--compare', type=Path, help="Earlier results to compare with")
+    args = parser.parse_args()
+    
+    from src.synthetic_data import write_sales_columnar
+    
+    results = {
+        'environment': environment(),
+        'parameters': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / 'sales_columnar'
+        write_sales_columnar(data_dir, years=args.years, seed=args.seed)
+        results['api'] = asyncio.run(benchmark_api(data_dir, args))
+    results['features'] = {} if args.skip_features else benchmark_features(args)
+    results['environment']['max_rss_mb'] = peak_rss_mb()
+    
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"✓ Results saved to {args.output}")
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
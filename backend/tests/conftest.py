@@ -0,0 +1,34 @@
+"""
+Shared fixtures: the trained models serving a small synthetic sales history
+"""
+import pytest
+
+from app.core.cache import prediction_cache
+from app.core.config import MODEL_PATHS, SCALED_MODELS, SCALER_PATH
+from app.models.model_loader import model_manager
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory):
+    """Columnar bundle of 2 years of history for 2 stores and 3 items"""
+    from src.synthetic_data import write_sales_columnar
+    
+    path = tmp_path_factory.mktemp("data") / "sales_columnar"
+    write_sales_columnar(path, n_stores=2, n_items=3, start_date='2016-01-01', years=2, seed=7)
+    return path
+
+
+@pytest.fixture(scope="session")
+def state(data_dir):
+    """Serving state with every model and the synthetic history loaded"""
+    model_manager.load_models(MODEL_PATHS, SCALED_MODELS, SCALER_PATH)
+    if not model_manager.load_data(data_dir):
+        pytest.fail(f"Could not load {data_dir}")
+    return model_manager.state
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    """Every test computes its predictions instead of reading an earlier test's"""
+    prediction_cache.invalidate()
+    yield
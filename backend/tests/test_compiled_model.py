@@ -0,0 +1,38 @@
+"""
+Compiled .npz models must score like the models they were exported from
+"""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import LAG_PERIODS, MODEL_PATHS, ROLLING_WINDOWS, SCALED_MODELS, SCALER_PATH
+from app.models.compiled_model import CompiledModel
+from app.services.feature_engineering import FEATURE_ORDER, feature_engineer
+
+
+@pytest.fixture(scope="module")
+def features(state):
+    """Feature rows for every series over the whole history"""
+    dates = pd.date_range('2016-01-01', '2018-01-31', freq='5D').strftime('%Y-%m-%d')
+    requests = [(store, item, date) for store in (1, 2) for item in (1, 2, 3) for date in dates]
+    features, _ = feature_engineer.prepare_features_batch(
+        requests, state.snapshot.series_index, state.snapshot.aggregates, LAG_PERIODS, ROLLING_WINDOWS
+    )
+    return pd.DataFrame(features, columns=FEATURE_ORDER)
+
+
+@pytest.mark.parametrize("name", list(MODEL_PATHS))
+def test_compiled_model_matches_original(name, features, tmp_path):
+    from src.model_utils import export_compiled_model
+    
+    model = joblib.load(MODEL_PATHS[name])
+    scaler = joblib.load(SCALER_PATH) if name in SCALED_MODELS else None
+    path = tmp_path / f"{name}.npz"
+    export_compiled_model(model, str(path), scaler=scaler, feature_names=FEATURE_ORDER)
+    
+    compiled = CompiledModel.load(path)
+    expected = model.predict(scaler.transform(features.to_numpy()) if scaler is not None else features)
+    
+    assert compiled.feature_names == FEATURE_ORDER
+    np.testing.assert_allclose(compiled.predict(features.to_numpy()), expected, atol=1e-3)
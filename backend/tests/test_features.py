@@ -0,0 +1,66 @@
+"""
+Lag and rolling features must match their pandas definitions
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import LAG_PERIODS, ROLLING_WINDOWS
+from app.services.feature_spec import ROLLING_STATS, segment_columns, series_columns
+
+
+def random_series(seed: int, n: int = 400, gaps: bool = True):
+    """Sorted day numbers (with missing days if gaps) and integer sales"""
+    rng = np.random.default_rng(seed)
+    days = np.arange(17000, 17000 + n)
+    if gaps:
+        days = np.sort(rng.choice(np.arange(17000, 17000 + 2 * n), n, replace=False))
+    return days, rng.integers(0, 60, n)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+def test_rolling_features_match_pandas(gaps):
+    days, sales = random_series(seed=1, gaps=gaps)
+    features = series_columns(days, sales, days, LAG_PERIODS, ROLLING_WINDOWS)
+    
+    # A window holds the last observations strictly before the prediction day
+    previous = pd.Series(sales, dtype=np.float64).shift(1)
+    for window in ROLLING_WINDOWS:
+        rolling = previous.rolling(window, min_periods=1)
+        for stat in ROLLING_STATS:
+            # The first day has no history (the whole-series statistic is used instead)
+            np.testing.assert_allclose(
+                features[f'sales_rolling_{stat}_{window}'][1:],
+                getattr(rolling, stat)().to_numpy()[1:],
+                err_msg=f"rolling {stat} over {window}"
+            )
+
+
+def test_lag_features_match_pandas():
+    days, sales = random_series(seed=2, gaps=False)
+    features = series_columns(days, sales, days, LAG_PERIODS, ROLLING_WINDOWS)
+    
+    for lag in LAG_PERIODS:
+        expected = pd.Series(sales, dtype=np.float64).shift(lag).to_numpy()
+        np.testing.assert_array_equal(features[f'sales_lag_{lag}'][lag:], expected[lag:])
+
+
+def test_segment_features_match_series_features():
+    series = [random_series(seed) for seed in range(5)]
+    series.append((np.array([17100]), np.array([4])))  # A single observation
+    days = np.concatenate([series_days for series_days, _ in series])
+    sales = np.concatenate([series_sales for _, series_sales in series])
+    bounds = np.cumsum([0] + [len(series_days) for series_days, _ in series])
+    
+    # Rows in random series order, from before each series starts to after it ends
+    rng = np.random.default_rng(3)
+    rows = rng.integers(0, len(series), 300)
+    pred_days = rng.integers(16950, 17900, len(rows))
+    features = segment_columns(
+        days, sales, bounds[rows], bounds[rows + 1], pred_days, LAG_PERIODS, ROLLING_WINDOWS
+    )
+    
+    for position, (row, pred_day) in enumerate(zip(rows, pred_days)):
+        expected = series_columns(*series[row], np.array([pred_day]), LAG_PERIODS, ROLLING_WINDOWS)
+        for name, values in expected.items():
+            np.testing.assert_array_equal(features[name][position], values[0], err_msg=name)
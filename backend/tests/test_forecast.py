@@ -0,0 +1,47 @@
+"""
+The recursive forecast must equal recomputing every day's features from scratch
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import LAG_PERIODS, ROLLING_WINDOWS
+from app.models.series_index import day_number
+from app.services.feature_engineering import feature_engineer
+from app.services.forecast_engine import recursive_forecaster
+
+
+@pytest.mark.parametrize("days_before_end", [0, 100])
+def test_recursive_forecast_matches_naive_recompute(state, days_before_end):
+    store, item, days = 2, 3, 21
+    snapshot = state.snapshot
+    base_date = snapshot.max_date - pd.Timedelta(days=days_before_end)
+    
+    forecast = recursive_forecaster.forecast(
+        series_keys=[(store, item)],
+        base_date=base_date,
+        days=days,
+        series_index=snapshot.series_index,
+        aggregates=snapshot.aggregates,
+        predict=state.predict_batch,
+        lag_periods=LAG_PERIODS,
+        rolling_windows=ROLLING_WINDOWS
+    )[0]
+    
+    # History up to the base date, then each prediction appended as the next day's sales
+    history_days, history_sales = snapshot.series_index.get(store, item)
+    base_day = int(day_number(base_date))
+    known = history_days <= base_day
+    expected = []
+    for step in range(days):
+        series = (
+            np.concatenate([history_days[known], base_day + 1 + np.arange(step)]),
+            np.concatenate([history_sales[known].astype(np.float64), expected])
+        )
+        date = (base_date + pd.Timedelta(days=step + 1)).strftime('%Y-%m-%d')
+        features, _ = feature_engineer.prepare_features(
+            store, item, date, series, snapshot.aggregates, LAG_PERIODS, ROLLING_WINDOWS
+        )
+        expected.append(float(state.predict_batch(features)[0]))
+    
+    np.testing.assert_allclose(forecast, expected, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,35 @@
+"""
+Materialized forecasts must equal scoring on demand
+"""
+import pandas as pd
+import pytest
+
+from app.models.series_index import day_number
+from app.services.forecast_table import forecast_materializer
+from app.services.prediction_service import prediction_service
+
+
+@pytest.fixture
+def on_demand(state):
+    """Results computed before any table exists, then the table built"""
+    base_date = state.snapshot.max_date
+    dates = ['2018-01-01', '2018-1-2', '2018-01-15', '2018-1-30']
+    predictions = {date: prediction_service.predict_sales(1, 2, date, state=state) for date in dates}
+    forecast = prediction_service.forecast_sales(1, 2, base_date, 30, state=state)
+    
+    assert forecast_materializer.refresh(state)
+    yield predictions, forecast
+    forecast_materializer.tables.pop(state.version, None)
+
+
+def test_table_matches_on_demand(state, on_demand):
+    predictions, forecast = on_demand
+    
+    # The table answers, also for dates without zero padding
+    for date in predictions:
+        day = int(day_number(pd.Timestamp(date)))
+        assert forecast_materializer.lookup_prediction(1, 2, day, state.version) is not None
+    
+    for date, expected in predictions.items():
+        assert prediction_service.predict_sales(1, 2, date, state=state) == expected
+    assert prediction_service.forecast_sales(1, 2, state.snapshot.max_date, 30, state=state) == forecast
@@ -0,0 +1,38 @@
+"""
+Batch predictions must equal single predictions
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.prediction_service import prediction_service
+
+
+# Every series on its first day (no history yet), inside the history, on
+# its last day and after it, with and without zero padding
+DATES = ('2016-01-01', '2016-03-15', '2017-6-5', '2017-12-31', '2018-01-20', '2018-1-3')
+REQUESTS = [(store, item, date) for store in (1, 2) for item in (1, 2, 3) for date in DATES]
+
+
+@pytest.mark.parametrize("model, weights", [
+    (None, None),
+    ('ridge', None),
+    (None, {'xgboost': 2.0, 'lightgbm': 1.0}),
+])
+def test_batch_matches_single(state, model, weights):
+    requests = REQUESTS + [(9, 9, '2017-01-01')]  # No history
+    results = prediction_service.predict_batch(requests, [(model, weights)] * len(requests), state)
+    
+    assert results[-1] is None
+    for (store, item, date), result in zip(requests, results[:-1]):
+        assert result == prediction_service.predict_sales(store, item, date, model, weights, state)
+
+
+def test_batch_endpoint_matches_predict_endpoint(state):
+    client = TestClient(app)
+    rows = [{'store': store, 'item': item, 'date': date} for store, item, date in REQUESTS]
+    
+    response = client.post('/batch-predict', json={'predictions': rows})
+    
+    assert response.status_code == 200
+    assert response.json() == [client.post('/predict', json=row).json() for row in rows]
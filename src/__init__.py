@@ -3,10 +3,14 @@ Inventory Prediction Utilities Package
 """
 
 from .data_processing import (
+    COMPACT_SALES_SCHEMA,
+    ROLLING_STATS,
     load_data,
+    downcast_dtypes,
     create_time_features,
     create_lag_features,
     create_rolling_features,
+    create_model_features,
     create_price_features,
     encode_categorical_features,
     split_train_test,
@@ -15,11 +19,24 @@ from .data_processing import (
     generate_sample_data
 )
 
+from .feature_pipeline import (
+    scan_sales_statistics,
+    build_feature_partitions,
+    read_feature_partition,
+    iter_feature_partitions
+)
+
+from .synthetic_data import (
+    generate_sales_data,
+    write_sales_columnar
+)
+
 from .model_utils import (
     calculate_metrics,
     evaluate_model,
     save_model,
     load_model,
+    export_compiled_model,
     predict_inventory,
     get_feature_importance,
     calculate_prediction_intervals,
@@ -43,10 +60,14 @@ from .visualization import (
 __version__ = '1.0.0'
 __all__ = [
     # Data processing
+    'COMPACT_SALES_SCHEMA',
+    'ROLLING_STATS',
     'load_data',
+    'downcast_dtypes',
     'create_time_features',
     'create_lag_features',
     'create_rolling_features',
+    'create_model_features',
     'create_price_features',
     'encode_categorical_features',
     'split_train_test',
@@ -54,11 +75,22 @@ __all__ = [
     'handle_missing_values',
     'generate_sample_data',
     
+    # Out-of-core feature pipeline
+    'scan_sales_statistics',
+    'build_feature_partitions',
+    'read_feature_partition',
+    'iter_feature_partitions',
+    
+    # Synthetic data
+    'generate_sales_data',
+    'write_sales_columnar',
+    
     # Model utilities
     'calculate_metrics',
     'evaluate_model',
     'save_model',
     'load_model',
+    'export_compiled_model',
     'predict_inventory',
     'get_feature_importance',
     'calculate_prediction_intervals',
@@ -8,19 +8,85 @@ This module contains functions for:
 - Train-test splitting
 """
 
+import importlib.util
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from pathlib import Path
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 
 
-def load_data(filepath: str) -> pd.DataFrame:
+# Rolling window statistics computed by create_rolling_features
+ROLLING_STATS = ('mean', 'std', 'min', 'max')
+
+# Compact dtypes for the Kaggle store-item sales columns. 'auto' picks the
+# narrowest signed integer type that holds the column's values.
+COMPACT_SALES_SCHEMA = {
+    'store': 'int8',
+    'item': 'int8',
+    'sales': 'auto',
+}
+
+# Feature definition shared with the API. Loaded from its file rather than
+# imported, since the backend is deployed as its own root package.
+FEATURE_SPEC_PATH = Path(__file__).resolve().parent.parent / 'backend' / 'app' / 'services' / 'feature_spec.py'
+_feature_spec_module = None
+
+
+def downcast_dtypes(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Downcast columns to the dtypes given in a schema.
+    
+    Args:
+        df: Input DataFrame
+        schema: Mapping of column name to a NumPy dtype name, or 'auto' for
+            the narrowest integer dtype that holds the column
+        
+    Returns:
+        DataFrame with downcast columns
+        
+    Raises:
+        ValueError: If a column is missing or would lose information
+    """
+    df = df.copy()
+    
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            raise ValueError(f"Schema column '{col}' not found in data")
+        values = df[col]
+        if values.isna().any():
+            raise ValueError(f"Column '{col}' has missing values")
+        
+        if dtype == 'auto':
+            narrowed = pd.to_numeric(values, downcast='integer')
+            if not pd.api.types.is_integer_dtype(narrowed):
+                raise ValueError(f"Column '{col}' has non-integer values")
+        else:
+            target = np.dtype(dtype)
+            if np.issubdtype(target, np.integer):
+                info = np.iinfo(target)
+                if values.min() < info.min or values.max() > info.max:
+                    raise ValueError(f"Column '{col}' has values outside the {target} range")
+            narrowed = values.astype(target)
+            if not np.array_equal(narrowed.to_numpy(), values.to_numpy()):
+                raise ValueError(f"Column '{col}' cannot be stored as {target} without loss")
+        
+        df[col] = narrowed
+    
+    return df
+
+
+def load_data(filepath: str, schema: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     """
     Load data from CSV file and perform basic validation.
     
     Args:
         filepath: Path to the CSV file
+        schema: Optional column dtypes to downcast to (see COMPACT_SALES_SCHEMA)
         
     Returns:
         DataFrame with loaded data
@@ -30,47 +96,50 @@ def load_data(filepath: str) -> pd.DataFrame:
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'])
     
+    if schema is not None:
+        before = df.memory_usage(deep=True).sum()
+        df = downcast_dtypes(df, schema)
+        after = df.memory_usage(deep=True).sum()
+        print(f"Memory usage: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    
     print(f"Data loaded successfully: {df.shape}")
     return df
 
 
-def create_time_features(df: pd.DataFrame, date_col: str = 'date') -> pd.DataFrame:
+def _add_columns(df: pd.DataFrame, columns: Dict[str, object], inplace: bool) -> pd.DataFrame:
+    """Add new columns to df itself, or to a single copy of it."""
+    if not inplace:
+        return df.assign(**columns)
+    for name, values in columns.items():
+        df[name] = values
+    return df
+
+
+def create_time_features(df: pd.DataFrame, date_col: str = 'date',
+                         inplace: bool = False) -> pd.DataFrame:
     """
     Create time-based features from date column.
     
+    The columns (calendar fields, weekend and month-boundary flags, and
+    cyclical encodings) are the ones the API computes, as float columns.
+    
     Args:
         df: Input DataFrame
         date_col: Name of the date column
+        inplace: Add the columns to df itself instead of a copy
         
     Returns:
         DataFrame with added time features
     """
-    df = df.copy()
-    
-    # Basic time features
-    df['year'] = df[date_col].dt.year
-    df['month'] = df[date_col].dt.month
-    df['day'] = df[date_col].dt.day
-    df['day_of_week'] = df[date_col].dt.dayofweek
-    df['week_of_year'] = df[date_col].dt.isocalendar().week
-    df['quarter'] = df[date_col].dt.quarter
-    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-    df['is_month_start'] = df[date_col].dt.is_month_start.astype(int)
-    df['is_month_end'] = df[date_col].dt.is_month_end.astype(int)
-    
-    # Cyclical features
-    df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-    df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-    df['day_of_week_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-    df['day_of_week_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-    
-    return df
+    columns = _feature_spec().time_columns(df[date_col].to_numpy())
+    return _add_columns(df, columns, inplace)
 
 
 def create_lag_features(df: pd.DataFrame, 
                        target_col: str,
                        group_cols: List[str],
-                       lags: List[int] = [1, 3, 7, 14, 30]) -> pd.DataFrame:
+                       lags: List[int] = [1, 3, 7, 14, 30],
+                       inplace: bool = False) -> pd.DataFrame:
     """
     Create lag features for time series forecasting.
     
@@ -79,45 +148,283 @@ def create_lag_features(df: pd.DataFrame,
         target_col: Name of the target column
         group_cols: List of columns to group by
         lags: List of lag periods
+        inplace: Add the columns to df itself instead of a copy
         
     Returns:
         DataFrame with added lag features
     """
-    df = df.copy()
+    grouped = df.groupby(group_cols, sort=False)[target_col]
+    columns = {f'{target_col}_lag_{lag}': grouped.shift(lag) for lag in lags}
     
-    for lag in lags:
-        df[f'{target_col}_lag_{lag}'] = df.groupby(group_cols)[target_col].shift(lag)
+    return _add_columns(df, columns, inplace)
+
+
+def _sliding_window(padded: np.ndarray, window: int, func: np.ufunc) -> np.ndarray:
+    """
+    Sum, minimum or maximum of every full window of an array, in O(n).
     
-    return df
+    Van Herk/Gil-Werman: with the array cut into blocks of `window`, each
+    window is the end of one block plus the start of the next, so it combines
+    one suffix and one prefix accumulation. Sums only ever accumulate within a
+    block, which keeps their rounding error at the scale of a single window.
+    
+    Args:
+        func: np.add, np.minimum or np.maximum
+        
+    Returns:
+        Result over padded[i - window + 1:i + 1] at each index i >= window - 1
+    """
+    identity = {np.add: 0.0, np.minimum: np.inf, np.maximum: -np.inf}[func]
+    n = len(padded)
+    blocks = -(-n // window)
+    values = np.full(blocks * window, identity)
+    values[:n] = padded
+    values = values.reshape(blocks, window)
+    
+    prefix = func.accumulate(values, axis=1).ravel()
+    suffix = func.accumulate(values[:, ::-1], axis=1)[:, ::-1].ravel()
+    
+    result = np.empty(n)
+    result[window - 1:] = func(suffix[:n - window + 1], prefix[window - 1:n])
+    if func is np.add:
+        # Windows that are exactly one block would be counted twice
+        result[window - 1::window] = prefix[window - 1:n:window]
+    return result
 
 
 def create_rolling_features(df: pd.DataFrame,
                            target_col: str,
                            group_cols: List[str],
-                           windows: List[int] = [7, 14, 30]) -> pd.DataFrame:
+                           windows: List[int] = [7, 14, 30],
+                           stats: Tuple[str, ...] = ('mean', 'std'),
+                           inplace: bool = False) -> pd.DataFrame:
     """
     Create rolling window features.
     
+    Same values as groupby(group_cols)[target_col].rolling(window,
+    min_periods=1) per group, in the frame's row order, but computed for all
+    groups at once with no per-group Python callbacks: counts come from a
+    cumulative sum, and sums, sums of squares, minima and maxima from
+    block-wise accumulations (see _sliding_window). Missing values are
+    skipped, as pandas does.
+    
     Args:
-        df: Input DataFrame
+        df: Input DataFrame, each group's rows in time order
         target_col: Name of the target column
         group_cols: List of columns to group by
         windows: List of window sizes
+        stats: Statistics to compute per window, from ROLLING_STATS
+        inplace: Add the columns to df itself instead of a copy
         
     Returns:
         DataFrame with added rolling features
     """
-    df = df.copy()
-    
+    unknown = set(stats) - set(ROLLING_STATS)
+    if unknown:
+        raise ValueError(f"Unknown rolling statistics: {sorted(unknown)}")
+    
+    # Make every group contiguous, keeping its rows in frame order
+    codes = df.groupby(group_cols, sort=False, dropna=False).ngroup().to_numpy()
+    n = len(codes)
+    positions = np.arange(n)
+    contiguous = bool(np.all(codes[1:] >= codes[:-1]))  # Frames sorted by group need no reordering
+    order = positions if contiguous else np.argsort(codes, kind='stable')
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = codes[order][1:] != codes[order][:-1]
+    group_start = np.maximum.accumulate(np.where(is_start, positions, 0))
+    group_rank = np.cumsum(is_start) - 1
+    
+    # Shift each group by its rounded mean: variances are unchanged, sums of
+    # squares stay small, and integer targets stay exact
+    values = df[target_col].to_numpy(dtype=np.float64)[order]
+    valid = ~np.isnan(values)
+    group_sums = np.bincount(group_rank, weights=np.where(valid, values, 0.0))
+    group_counts = np.bincount(group_rank, weights=valid)
+    shift = np.round(group_sums / np.maximum(group_counts, 1))[group_rank]
+    centered = np.where(valid, values - shift, 0.0)
+    cum_count = np.concatenate([[0], np.cumsum(valid)])
+    
+    columns = {}
     for window in windows:
-        df[f'{target_col}_rolling_mean_{window}'] = df.groupby(group_cols)[target_col].transform(
-            lambda x: x.rolling(window=window, min_periods=1).mean()
-        )
-        df[f'{target_col}_rolling_std_{window}'] = df.groupby(group_cols)[target_col].transform(
-            lambda x: x.rolling(window=window, min_periods=1).std()
-        )
+        start = np.maximum(group_start, positions - window + 1)
+        count = cum_count[positions + 1] - cum_count[start]
+        
+        # window - 1 filler slots before every group keep windows inside their group
+        padded_positions = positions + (window - 1) * (group_rank + 1)
+        padded_length = n + (window - 1) * (group_rank[-1] + 1 if n else 0)
+        
+        def rolling(column: np.ndarray, func: np.ufunc) -> np.ndarray:
+            padded = np.full(padded_length, 0.0 if func is np.add else np.nan)
+            padded[padded_positions] = column
+            if func is not np.add:
+                padded[np.isnan(padded)] = np.inf if func is np.minimum else -np.inf
+            return _sliding_window(padded, window, func)[padded_positions]
+        
+        results = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            total = rolling(centered, np.add)
+            if 'mean' in stats:
+                results['mean'] = np.where(count > 0, (total + shift * count) / count, np.nan)
+            if 'std' in stats:
+                squares = rolling(centered * centered, np.add)
+                variance = np.maximum(squares - total * total / count, 0.0) / (count - 1)
+                results['std'] = np.where(count > 1, np.sqrt(variance), np.nan)
+            if 'min' in stats:
+                results['min'] = np.where(count > 0, rolling(values, np.minimum), np.nan)
+            if 'max' in stats:
+                results['max'] = np.where(count > 0, rolling(values, np.maximum), np.nan)
+        
+        for stat in stats:
+            column = results[stat]
+            if not contiguous:
+                column = np.empty(n)
+                column[order] = results[stat]
+            columns[f'{target_col}_rolling_{stat}_{window}'] = pd.Series(column, index=df.index)
+    
+    return _add_columns(df, columns, inplace)
+
+
+def _feature_spec():
+    """The API's feature_spec module, loaded once"""
+    global _feature_spec_module
+    if _feature_spec_module is None:
+        spec = importlib.util.spec_from_file_location('feature_spec', FEATURE_SPEC_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _feature_spec_module = module
+    return _feature_spec_module
+
+
+def _fill_series_features(spec, arrays: Dict[str, np.ndarray], first: int, last: int) -> None:
+    """Compute lag and rolling features of series first..last-1 into arrays['out']."""
+    days, values, offsets, out = arrays['days'], arrays['values'], arrays['offsets'], arrays['out']
+    for group in range(first, last):
+        start, stop = offsets[group], offsets[group + 1]
+        features = spec.series_columns(days[start:stop], values[start:stop], days[start:stop])
+        for row, name in enumerate(spec.series_features):
+            out[row, start:stop] = features[name]
+
+
+def _series_features_shard(spec_args: Tuple, blocks: Dict[str, Tuple[str, str, Tuple[int, ...]]],
+                           first: int, last: int) -> None:
+    """
+    Process pool task: features of a range of series, through shared memory.
     
-    return df
+    Args:
+        spec_args: FeatureSpec arguments
+        blocks: Shared memory name, dtype and shape of each array
+        first, last: Range of series (positions in arrays['offsets'])
+    """
+    spec = _feature_spec().FeatureSpec(*spec_args)
+    handles = {name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in blocks.items()}
+    try:
+        arrays = {
+            name: np.ndarray(shape, dtype=dtype, buffer=handles[name].buf)
+            for name, (_, dtype, shape) in blocks.items()
+        }
+        _fill_series_features(spec, arrays, first, last)
+        del arrays  # Views must be released before the blocks are closed
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+def _parallel_series_features(df: pd.DataFrame, spec, n_jobs: int) -> Dict[str, np.ndarray]:
+    """
+    Lag and rolling features of every row, with series sharded across processes.
+    
+    Rows are laid out series by series in time order in shared memory, and
+    every worker writes its series' slice of one shared output matrix, so
+    no DataFrames or results are pickled.
+    """
+    n = len(df)
+    row_days = df['date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    codes = df.groupby(['store', 'item'], sort=False).ngroup().to_numpy()
+    order = np.lexsort((row_days, codes))
+    offsets = np.concatenate(([0], np.flatnonzero(np.diff(codes[order])) + 1, [n]))
+    n_groups = len(offsets) - 1
+    names = spec.series_features
+    sources = {
+        'days': row_days[order],
+        'values': df[spec.target].to_numpy(dtype=np.float64)[order],
+        'offsets': offsets,
+        'out': np.empty((len(names), n)),
+    }
+    
+    handles = {}
+    try:
+        blocks = {}
+        for name, values in sources.items():
+            handle = handles[name] = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=handle.buf)[...] = values
+            blocks[name] = (handle.name, values.dtype.str, values.shape)
+        
+        # A few shards per worker with about equal rows each, to even out the load
+        shards = min(n_groups, n_jobs * 4)
+        bounds = np.unique(np.concatenate((
+            [0], np.searchsorted(offsets, np.linspace(0, n, shards + 1)[1:-1]), [n_groups]
+        )))
+        spec_args = (spec.lag_periods, spec.rolling_windows, spec.target)
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [
+                pool.submit(_series_features_shard, spec_args, blocks, int(first), int(last))
+                for first, last in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+        
+        # Back to the frame's row order
+        out = np.ndarray(sources['out'].shape, dtype=np.float64, buffer=handles['out'].buf)
+        columns = {}
+        for row, name in enumerate(names):
+            columns[name] = np.empty(n)
+            columns[name][order] = out[row]
+        del out
+        return columns
+    finally:
+        for handle in handles.values():
+            handle.close()
+            handle.unlink()
+
+
+def create_model_features(df: pd.DataFrame,
+                          lag_periods: List[int] = [1, 3, 7, 14, 30, 60, 90],
+                          rolling_windows: List[int] = [7, 14, 30, 60, 90],
+                          target_col: str = 'sales',
+                          feature_names_path: Optional[str] = None,
+                          n_jobs: int = 1) -> pd.DataFrame:
+    """
+    Create the feature matrix the API serves models with.
+    
+    Features come from the same FeatureSpec and engine the API uses
+    (backend/app/services/feature_spec.py), so a model trained on them sees
+    exactly the inputs it will be served: lags and rolling windows use only
+    days before each row's date, and missing history falls back to the
+    whole series' statistic.
+    
+    Args:
+        df: Sales history with date, store, item and target columns
+        lag_periods: Lag periods in days
+        rolling_windows: Rolling window sizes
+        target_col: Name of the target column
+        feature_names_path: Pickled feature name list to check the columns
+            against (e.g. models/feature_names.pkl)
+        n_jobs: Worker processes for the lag and rolling features, which
+            are independent per series (-1 for one per CPU core)
+        
+    Returns:
+        DataFrame of model features in serving column order, indexed like df
+    """
+    spec = _feature_spec().FeatureSpec(lag_periods, rolling_windows, target=target_col)
+    if feature_names_path is not None and not spec.validate_file(Path(feature_names_path)):
+        raise FileNotFoundError(f"Feature names file not found: {feature_names_path}")
+    
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    series_features = None
+    if n_jobs > 1 and len(df) > 0:
+        series_features = _parallel_series_features(df, spec, n_jobs)
+    return spec.frame_features(df, series_features=series_features)
 
 
 def create_price_features(df: pd.DataFrame) -> pd.DataFrame:
@@ -250,15 +557,20 @@ def handle_missing_values(df: pd.DataFrame,
 def generate_sample_data(start_date: str = '2023-01-01',
                         end_date: str = '2024-12-31',
                         products: List[str] = None,
-                        stores: List[str] = None) -> pd.DataFrame:
+                        stores: List[str] = None,
+                        seed: int = 42) -> pd.DataFrame:
     """
     Generate sample sales data for testing.
     
+    Every row is drawn at once over the date x product x store grid. For
+    large Kaggle-shaped data sets, see src.synthetic_data.
+    
     Args:
         start_date: Start date for data generation
         end_date: End date for data generation
         products: List of product names
         stores: List of store names
+        seed: Random seed
         
     Returns:
         DataFrame with sample sales data
@@ -269,36 +581,37 @@ def generate_sample_data(start_date: str = '2023-01-01',
     if stores is None:
         stores = ['Store_1', 'Store_2', 'Store_3', 'Store_4']
     
-    np.random.seed(42)
+    rng = np.random.default_rng(seed)
     
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    data = []
-    for date in date_range:
-        for product in products:
-            for store in stores:
-                base_sales = np.random.poisson(50)
-                month_factor = 1 + 0.3 * np.sin(2 * np.pi * date.month / 12)
-                weekend_factor = 1.2 if date.weekday() >= 5 else 1.0
-                holiday_factor = 1.5 if date.month == 12 else 1.0
-                
-                sales = int(base_sales * month_factor * weekend_factor * holiday_factor)
-                
-                base_price = {'Product_A': 29.99, 'Product_B': 49.99, 'Product_C': 19.99,
-                             'Product_D': 39.99, 'Product_E': 24.99}[product]
-                price = base_price * np.random.uniform(0.9, 1.1)
-                promotion = np.random.choice([0, 1], p=[0.8, 0.2])
-                competitor_price = price * np.random.uniform(0.85, 1.15)
-                
-                data.append({
-                    'date': date,
-                    'product': product,
-                    'store': store,
-                    'sales': sales,
-                    'price': round(price, 2),
-                    'promotion': promotion,
-                    'competitor_price': round(competitor_price, 2),
-                    'inventory_level': sales + np.random.randint(10, 50)
-                })
-    
-    return pd.DataFrame(data)
+    shape = (len(date_range), len(products), len(stores))
+    n = int(np.prod(shape))
+    
+    # Date-major grid, products then stores within each date
+    date_index, product_index, store_index = (index.ravel() for index in np.indices(shape))
+    dates = date_range[date_index]
+    month = dates.month.to_numpy()
+    
+    base_sales = rng.poisson(50, n)
+    month_factor = 1 + 0.3 * np.sin(2 * np.pi * month / 12)
+    weekend_factor = np.where(dates.weekday.to_numpy() >= 5, 1.2, 1.0)
+    holiday_factor = np.where(month == 12, 1.5, 1.0)
+    sales = (base_sales * month_factor * weekend_factor * holiday_factor).astype(int)
+    
+    default_prices = {'Product_A': 29.99, 'Product_B': 49.99, 'Product_C': 19.99,
+                      'Product_D': 39.99, 'Product_E': 24.99}
+    base_price = np.array([default_prices[product] for product in products])[product_index]
+    price = base_price * rng.uniform(0.9, 1.1, n)
+    promotion = (rng.random(n) < 0.2).astype(int)
+    competitor_price = price * rng.uniform(0.85, 1.15, n)
+    
+    return pd.DataFrame({
+        'date': dates,
+        'product': np.asarray(products, dtype=object)[product_index],
+        'store': np.asarray(stores, dtype=object)[store_index],
+        'sales': sales,
+        'price': np.round(price, 2),
+        'promotion': promotion,
+        'competitor_price': np.round(competitor_price, 2),
+        'inventory_level': sales + rng.integers(10, 50, n)
+    })
@@ -0,0 +1,312 @@
+"""
+Out-of-core feature pipeline for sales histories larger than memory.
+
+This module contains functions for:
+- Scanning a sales CSV in chunks for whole-series and aggregate statistics
+- Building model features chunk by chunk, carrying each series' lag and
+  rolling warm-up tail across chunk boundaries
+- Writing the features to disk as columnar (store, item) partitions
+- Reading feature partitions back
+
+Features are the ones create_model_features computes for a whole frame,
+so peak memory is bounded by the chunk size (plus one short tail per
+series) rather than by the size of the data set.
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from .data_processing import _feature_spec
+
+
+FEATURE_BUNDLE_VERSION = 1
+
+
+def _read_chunks(csv_path: str, chunksize: int, target_col: str) -> Iterator[pd.DataFrame]:
+    """Stream the sales CSV in chunks, with dates parsed and day numbers added."""
+    for chunk in pd.read_csv(csv_path, usecols=['date', 'store', 'item', target_col],
+                             chunksize=chunksize):
+        chunk['date'] = pd.to_datetime(chunk['date'])
+        chunk['day'] = chunk['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        yield chunk
+
+
+def _combine_series_stats(stats: Optional[pd.DataFrame], chunk_stats: pd.DataFrame) -> pd.DataFrame:
+    """Merge per-series count, sum, sum of squares, min and max of two chunks."""
+    if stats is None:
+        return chunk_stats
+    return pd.concat([stats, chunk_stats]).groupby(level=[0, 1]).agg(
+        {'count': 'sum', 'total': 'sum', 'squares': 'sum', 'low': 'min', 'high': 'max'}
+    )
+
+
+def _add_counts(counts: Optional[pd.Series], chunk_counts: pd.Series) -> pd.Series:
+    """Merge (key, value) histograms of two chunks."""
+    if counts is None:
+        return chunk_counts
+    return counts.add(chunk_counts, fill_value=0).astype(np.int64)
+
+
+def _moments(stats: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """
+    Mean and sample standard deviation from integer count, sum and sum of squares.
+    
+    The variance numerator is computed in exact integer arithmetic, so the
+    result does not depend on how the data was chunked.
+    """
+    count = stats['count'].to_numpy().astype(object)
+    total = stats['total'].to_numpy().astype(object)
+    squares = stats['squares'].to_numpy().astype(object)
+    numerator = (count * squares - total * total).astype(np.float64)
+    count = count.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(count > 1, np.sqrt(numerator / (count * (count - 1))), np.nan)
+    mean = stats['total'].to_numpy() / count
+    return pd.Series(mean, index=stats.index), pd.Series(std, index=stats.index)
+
+
+def _median(counts: pd.Series) -> pd.Series:
+    """Per-key median from a (key, value) -> count histogram, as pandas computes it."""
+    counts = counts[counts > 0].sort_index()
+    values = counts.index.get_level_values(1).to_numpy(dtype=np.float64)
+    cumulative = counts.groupby(level=0).cumsum().to_numpy()
+    total = counts.groupby(level=0).transform('sum').to_numpy()
+    keys = counts.index.get_level_values(0)
+    
+    # The k-th smallest value is the first one whose cumulative count exceeds k
+    lower = pd.Series(np.where(cumulative > (total - 1) // 2, values, np.inf)).groupby(keys).min()
+    upper = pd.Series(np.where(cumulative > total // 2, values, np.inf)).groupby(keys).min()
+    return (lower + upper) / 2
+
+
+def scan_sales_statistics(csv_path: str,
+                          chunksize: int = 250_000,
+                          target_col: str = 'sales') -> Dict[str, pd.DataFrame]:
+    """
+    Compute whole-series and aggregate statistics of a sales CSV in one pass.
+    
+    Only per-series sums and per-store and per-item value histograms are
+    kept in memory, so the target must hold integer counts.
+    
+    Args:
+        csv_path: Sales CSV with date, store, item and target columns
+        chunksize: Rows read at a time
+        target_col: Name of the target column
+    
+    Returns:
+        Dictionary with 'series' (mean, std, min, max per store-item),
+        'store' and 'item' (avg, std, median) statistics
+    """
+    series_stats, store_counts, item_counts = None, None, None
+    for chunk in _read_chunks(csv_path, chunksize, target_col):
+        values = chunk[target_col].to_numpy()
+        if np.isnan(values.astype(np.float64)).any() or not np.array_equal(values, np.round(values)):
+            raise ValueError(f"Column '{target_col}' must hold integer values for chunked processing")
+        
+        frame = pd.DataFrame({
+            'store': chunk['store'].to_numpy(),
+            'item': chunk['item'].to_numpy(),
+            'value': values.astype(np.int64),
+        })
+        frame['square'] = frame['value'] * frame['value']
+        chunk_stats = frame.groupby(['store', 'item']).agg(
+            count=('value', 'size'), total=('value', 'sum'), squares=('square', 'sum'),
+            low=('value', 'min'), high=('value', 'max')
+        )
+        series_stats = _combine_series_stats(series_stats, chunk_stats)
+        store_counts = _add_counts(store_counts, frame.groupby(['store', 'value']).size())
+        item_counts = _add_counts(item_counts, frame.groupby(['item', 'value']).size())
+    
+    if series_stats is None:
+        raise ValueError(f"No rows in {csv_path}")
+    
+    results = {}
+    mean, std = _moments(series_stats)
+    results['series'] = pd.DataFrame({
+        'mean': mean, 'std': std,
+        'min': series_stats['low'].astype(np.float64),
+        'max': series_stats['high'].astype(np.float64),
+    })
+    for level, counts in (('store', store_counts), ('item', item_counts)):
+        level_stats = series_stats.groupby(level=level)[['count', 'total', 'squares']].sum()
+        mean, std = _moments(level_stats)
+        results[level] = pd.DataFrame({'avg': mean, 'std': std, 'median': _median(counts)})
+    
+    return results
+
+
+def _tail(days: np.ndarray, sales: np.ndarray, history_days: int,
+          history_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The part of a series' history later rows can still reach.
+    
+    Rows on or after the last day need the last observation on or before
+    each lag date (no earlier than last day - history_days) and the
+    history_rows observations before them.
+    """
+    lag_start = np.searchsorted(days, days[-1] - history_days, side='right') - 1
+    window_start = np.searchsorted(days, days[-1], side='left') - history_rows
+    start = max(min(lag_start, window_start), 0)
+    return days[start:].copy(), sales[start:].copy()
+
+
+def _write_part(part_dir: Path, columns: Dict[str, np.ndarray], positions: np.ndarray) -> None:
+    """Write the given rows of a chunk's columns as one .npy file per column."""
+    part_dir.mkdir(parents=True)
+    for name, values in columns.items():
+        np.save(part_dir / f"{name}.npy", values[positions])
+
+
+def build_feature_partitions(csv_path: str,
+                             out_dir: str,
+                             n_partitions: int = 16,
+                             chunksize: int = 250_000,
+                             lag_periods: List[int] = [1, 3, 7, 14, 30, 60, 90],
+                             rolling_windows: List[int] = [7, 14, 30, 60, 90],
+                             target_col: str = 'sales') -> Dict:
+    """
+    Build model features for a sales CSV chunk by chunk and write them to disk.
+    
+    The CSV is read twice: once for the whole-series and aggregate
+    statistics (see scan_sales_statistics), then chunk by chunk for the
+    features. Each series keeps a short tail of its history between chunks
+    (enough for its longest lag and rolling window), so the features equal
+    those of create_model_features on the whole frame (up to floating-point
+    rounding of the standard deviations). Each series' rows
+    must be in date order in the file, as in date-sorted or series-sorted
+    exports; the series themselves may be interleaved.
+    
+    The output directory holds one partition-NNN directory per hash
+    partition of (store, item), each with one part-NNNNN directory per
+    chunk that had rows for it, and meta.json. Parts hold one .npy file per
+    column: store, item, date, the target and every feature.
+    
+    Args:
+        csv_path: Sales CSV with date, store, item and target columns
+        out_dir: Output directory (replaced if it exists)
+        n_partitions: Number of (store, item) partitions
+        chunksize: Rows processed at a time
+        lag_periods: Lag periods in days
+        rolling_windows: Rolling window sizes
+        target_col: Name of the target column
+    
+    Returns:
+        Contents of meta.json
+    
+    Raises:
+        ValueError: If a series' rows are not in date order
+    """
+    spec = _feature_spec().FeatureSpec(lag_periods, rolling_windows, target=target_col)
+    time_columns = _feature_spec().time_columns
+    stats = scan_sales_statistics(csv_path, chunksize, target_col)
+    fallbacks = {
+        key: tuple(values)
+        for key, values in zip(stats['series'].index, stats['series'][['mean', 'std', 'min', 'max']].to_numpy())
+    }
+    
+    # Write next to the target and rename, so readers never see a partial bundle
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    
+    tails: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+    partition_rows = np.zeros(n_partitions, dtype=np.int64)
+    records = 0
+    for number, chunk in enumerate(_read_chunks(csv_path, chunksize, target_col)):
+        n = len(chunk)
+        days = chunk['day'].to_numpy()
+        target = chunk[target_col].to_numpy()
+        stores = chunk['store'].to_numpy()
+        items = chunk['item'].to_numpy()
+        
+        columns = {'store': stores, 'item': items, 'date': days.astype('datetime64[D]'), target_col: target}
+        features = time_columns(chunk['date'].to_numpy())
+        features['item'] = items.astype(np.float64)
+        
+        # Lags and rolling windows over the carried tail plus this chunk's rows
+        for key, positions in chunk.groupby(['store', 'item'], sort=False).indices.items():
+            chunk_days = days[positions]
+            tail_days, tail_sales = tails.get(key, (chunk_days[:0], target[:0]))
+            if np.any(np.diff(chunk_days) < 0) or (len(tail_days) and chunk_days[0] < tail_days[-1]):
+                raise ValueError(f"Rows of store {key[0]}, item {key[1]} are not in date order")
+            
+            history_days = np.concatenate((tail_days, chunk_days))
+            history_sales = np.concatenate((tail_sales, target[positions]))
+            series_features = spec.series_columns(history_days, history_sales, chunk_days, fallback=fallbacks[key])
+            for name, values in series_features.items():
+                features.setdefault(name, np.empty(n))[positions] = values
+            tails[key] = _tail(history_days, history_sales, spec.history_days, spec.history_rows)
+        
+        # Aggregates from the first pass
+        for level, keys in (('store', stores), ('item', items)):
+            for stat in ('avg', 'std', 'median'):
+                features[f'{level}_{stat}_{target_col}'] = stats[level][stat].reindex(keys).to_numpy()
+        series_keys = pd.MultiIndex.from_arrays([stores, items])
+        features[f'store_item_avg_{target_col}'] = stats['series']['mean'].reindex(series_keys).to_numpy()
+        features[f'store_item_std_{target_col}'] = stats['series']['std'].reindex(series_keys).to_numpy()
+        
+        columns.update((name, features[name]) for name in spec.feature_names if name not in columns)
+        partitions = (stores.astype(np.int64) * 1_000_003 + items.astype(np.int64)) % n_partitions
+        for partition in np.unique(partitions):
+            positions = np.flatnonzero(partitions == partition)
+            _write_part(tmp_dir / f"partition-{partition:03d}" / f"part-{number:05d}", columns, positions)
+            partition_rows[partition] += len(positions)
+        records += n
+        print(f"Chunk {number}: {records} rows processed")
+    
+    meta = {
+        'format_version': FEATURE_BUNDLE_VERSION,
+        'records': int(records),
+        'partitions': {f"partition-{p:03d}": int(rows) for p, rows in enumerate(partition_rows) if rows},
+        'feature_names': spec.feature_names,
+        'target': target_col,
+        'source': str(csv_path),
+    }
+    (tmp_dir / 'meta.json').write_text(json.dumps(meta, indent=2))
+    
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp_dir.rename(out_dir)
+    print(f"Feature partitions written to {out_dir}: {records} rows, {len(meta['partitions'])} partitions")
+    return meta
+
+
+def read_feature_partition(out_dir: str, partition: str,
+                           columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load one partition written by build_feature_partitions.
+    
+    Args:
+        out_dir: Feature bundle directory
+        partition: Partition name from meta.json (e.g. 'partition-003')
+        columns: Columns to load (default: all)
+    
+    Returns:
+        DataFrame with the partition's rows, in file order per chunk
+    """
+    out_dir = Path(out_dir)
+    meta = json.loads((out_dir / 'meta.json').read_text())
+    if columns is None:
+        columns = ['store', 'item', 'date', meta['target']]
+        columns += [name for name in meta['feature_names'] if name not in columns]
+    
+    parts = sorted((out_dir / partition).glob('part-*'))
+    data = {
+        name: np.concatenate([np.load(part / f"{name}.npy", mmap_mode='r') for part in parts])
+        for name in columns
+    }
+    if 'date' in data:
+        data['date'] = data['date'].astype('datetime64[ns]')
+    return pd.DataFrame(data)
+
+
+def iter_feature_partitions(out_dir: str,
+                            columns: Optional[List[str]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Yield (partition name, DataFrame) for every partition of a feature bundle, one at a time."""
+    meta = json.loads((Path(out_dir) / 'meta.json').read_text())
+    for partition in meta['partitions']:
+        yield partition, read_feature_partition(out_dir, partition, columns)
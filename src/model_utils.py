@@ -8,9 +8,12 @@ This module contains functions for:
 - Performance metrics calculation
 """
 
+import importlib.util
+import io
 import numpy as np
 import pandas as pd
 import joblib
+from pathlib import Path
 from typing import Dict, Any, List, Tuple
 from sklearn.metrics import (mean_squared_error, mean_absolute_error, 
                             r2_score, mean_absolute_percentage_error)
@@ -95,6 +98,286 @@ def load_model(filepath: str) -> Any:
     return model
 
 
+# Compiled (prediction-only) model format. Tree ensembles are flattened into
+# node arrays and linear models into one weight vector, saved with np.savez so
+# they can be scored with NumPy alone. The format (version, missing-value
+# modes) and its scorer are the API's compiled_model module, loaded from its
+# file like the feature spec in data_processing, so exports are checked by the
+# code that serves them.
+COMPILED_MODEL_PATH = Path(__file__).resolve().parent.parent / 'backend' / 'app' / 'models' / 'compiled_model.py'
+_compiled_model_module = None
+
+
+def _compiled_model():
+    """The API's compiled_model module, loaded once"""
+    global _compiled_model_module
+    if _compiled_model_module is None:
+        spec = importlib.util.spec_from_file_location('compiled_model', COMPILED_MODEL_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _compiled_model_module = module
+    return _compiled_model_module
+
+
+def _flatten_trees(trees: List[List[Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Concatenate per-tree node lists into flat node arrays.
+    
+    Each node is a dict with feature, threshold, left, right (tree-local
+    indices, -1 for leaves), default_left, missing and value. Leaves point to
+    themselves, so evaluation can run a fixed number of steps.
+    
+    Args:
+        trees: Node lists, one per tree, root first
+        
+    Returns:
+        Dictionary of node arrays plus per-tree root offsets
+    """
+    columns = {name: [] for name in ['feature', 'threshold', 'left', 'right',
+                                     'default_left', 'missing', 'value']}
+    roots = []
+    
+    for nodes in trees:
+        offset = len(columns['feature'])
+        roots.append(offset)
+        for position, node in enumerate(nodes):
+            is_leaf = node['left'] < 0
+            columns['feature'].append(0 if is_leaf else node['feature'])
+            columns['threshold'].append(0.0 if is_leaf else node['threshold'])
+            columns['left'].append(offset + (position if is_leaf else node['left']))
+            columns['right'].append(offset + (position if is_leaf else node['right']))
+            columns['default_left'].append(bool(node['default_left']))
+            columns['missing'].append(node['missing'])
+            columns['value'].append(node['value'] if is_leaf else 0.0)
+    
+    return {
+        'feature': np.asarray(columns['feature'], dtype=np.int32),
+        'threshold': np.asarray(columns['threshold'], dtype=np.float64),
+        'left': np.asarray(columns['left'], dtype=np.int32),
+        'right': np.asarray(columns['right'], dtype=np.int32),
+        'default_left': np.asarray(columns['default_left'], dtype=bool),
+        'missing': np.asarray(columns['missing'], dtype=np.int8),
+        'value': np.asarray(columns['value'], dtype=np.float64),
+        'roots': np.asarray(roots, dtype=np.int32)
+    }
+
+
+def _tree_depth(nodes: List[Dict[str, Any]]) -> int:
+    """Number of splits on the longest root-to-leaf path."""
+    depth = [0] * len(nodes)
+    for position, node in enumerate(nodes):
+        if node['left'] >= 0:
+            depth[node['left']] = depth[node['right']] = depth[position] + 1
+    return max(depth)
+
+
+def compile_xgboost_model(model: Any) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Flatten an XGBoost regressor (or Booster) into node arrays.
+    
+    Args:
+        model: Trained XGBRegressor or xgboost.Booster
+        
+    Returns:
+        Tuple of (node arrays, metadata)
+    """
+    import json
+    
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    learner = json.loads(booster.save_raw('json'))['learner']
+    
+    objective = learner['objective']['name']
+    if objective != 'reg:squarederror':
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    if learner['gradient_booster']['name'] != 'gbtree':
+        raise ValueError("Only gbtree XGBoost models can be compiled")
+    
+    missing_default = _compiled_model().MISSING_DEFAULT
+    trees = []
+    for tree in learner['gradient_booster']['model']['trees']:
+        if int(tree['tree_param'].get('num_nodes', 0)) and any(tree['split_type']):
+            raise ValueError("Categorical XGBoost splits are not supported")
+        trees.append([
+            {
+                'feature': tree['split_indices'][i],
+                'threshold': tree['split_conditions'][i],
+                'left': tree['left_children'][i],
+                'right': tree['right_children'][i],
+                'default_left': tree['default_left'][i],
+                'missing': missing_default,
+                'value': tree['split_conditions'][i]  # Leaf values live here
+            }
+            for i in range(len(tree['left_children']))
+        ])
+    
+    # Same trees the sklearn wrapper predicts with (up to early stopping, if used)
+    if hasattr(booster, 'best_iteration'):
+        trees = trees[:booster.best_iteration + 1]
+    
+    meta = {
+        'source': 'xgboost',
+        'decision': 'lt',             # x < threshold goes left
+        'input_dtype': 'float32',     # XGBoost compares in single precision
+        'base_score': float(learner['learner_model_param']['base_score'].strip('[]')),
+        'max_depth': max(_tree_depth(nodes) for nodes in trees),
+        'feature_names': list(booster.feature_names or [])
+    }
+    return _flatten_trees(trees), meta
+
+
+def compile_lightgbm_model(model: Any) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Flatten a LightGBM regressor (or Booster) into node arrays.
+    
+    Args:
+        model: Trained LGBMRegressor or lightgbm.Booster
+        
+    Returns:
+        Tuple of (node arrays, metadata)
+    """
+    booster = model.booster_ if hasattr(model, 'booster_') else model
+    dump = booster.dump_model()
+    
+    if dump['num_tree_per_iteration'] != 1 or dump['objective'].split()[0] != 'regression':
+        raise ValueError(f"Unsupported LightGBM objective: {dump['objective']}")
+    
+    compiled_model = _compiled_model()
+    missing_modes = {
+        'None': compiled_model.MISSING_AS_ZERO,
+        'Zero': compiled_model.MISSING_OR_ZERO,
+        'NaN': compiled_model.MISSING_DEFAULT
+    }
+    
+    def flatten(root: Dict[str, Any]) -> List[Dict[str, Any]]:
+        nodes, stack = [], [(root, None, None)]
+        while stack:
+            node, parent, side = stack.pop()
+            position = len(nodes)
+            if parent is not None:
+                nodes[parent][side] = position
+            if 'split_feature' not in node:
+                nodes.append({'feature': 0, 'threshold': 0.0, 'left': -1, 'right': -1,
+                              'default_left': False, 'missing': compiled_model.MISSING_DEFAULT,
+                              'value': node['leaf_value']})
+                continue
+            if node['decision_type'] != '<=':
+                raise ValueError("Categorical LightGBM splits are not supported")
+            nodes.append({'feature': node['split_feature'], 'threshold': node['threshold'],
+                          'left': -1, 'right': -1, 'default_left': node['default_left'],
+                          'missing': missing_modes[node['missing_type']], 'value': 0.0})
+            stack.append((node['right_child'], position, 'right'))
+            stack.append((node['left_child'], position, 'left'))
+        return nodes
+    
+    trees = [flatten(tree['tree_structure']) for tree in dump['tree_info']]
+    
+    # Same trees the sklearn wrapper predicts with (up to early stopping, if used)
+    best_iteration = getattr(model, 'best_iteration_', 0) or 0
+    if best_iteration > 0:
+        trees = trees[:best_iteration]
+    
+    meta = {
+        'source': 'lightgbm',
+        'decision': 'le',             # x <= threshold goes left
+        'input_dtype': 'float64',
+        'base_score': 0.0,
+        'max_depth': max(_tree_depth(nodes) for nodes in trees),
+        'feature_names': list(dump['feature_names'])
+    }
+    return _flatten_trees(trees), meta
+
+
+def compile_linear_model(model: Any, scaler: Any = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Fold a linear model and its StandardScaler into one weight vector.
+    
+    Args:
+        model: Trained linear model with coef_ and intercept_ (e.g. Ridge)
+        scaler: StandardScaler the model was trained behind (optional)
+        
+    Returns:
+        Tuple of (weights and intercept arrays, metadata)
+    """
+    weights = np.asarray(model.coef_, dtype=np.float64).ravel()
+    intercept = float(np.ravel(model.intercept_)[0])
+    
+    if scaler is not None:
+        # ((x - mean) / scale) @ w + b  ==  x @ (w / scale) + (b - mean @ (w / scale))
+        scale = scaler.scale_ if scaler.with_std else np.ones_like(weights)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros_like(weights)
+        weights = weights / scale
+        intercept = intercept - float(mean @ weights)
+    
+    meta = {
+        'source': type(model).__name__.lower(),
+        'input_dtype': 'float64',
+        'feature_names': list(getattr(scaler, 'feature_names_in_', getattr(model, 'feature_names_in_', [])))
+    }
+    return {'weights': weights, 'intercept': np.asarray([intercept])}, meta
+
+
+def export_compiled_model(model: Any,
+                          filepath: str,
+                          scaler: Any = None,
+                          feature_names: List[str] = None,
+                          X_check: np.ndarray = None,
+                          tolerance: float = 1e-3) -> Dict[str, Any]:
+    """
+    Compile a trained model into a prediction-only .npz file.
+    
+    Supports XGBoost and LightGBM tree ensembles and linear models (with an
+    optional StandardScaler folded in). The file only needs NumPy to score.
+    
+    Args:
+        model: Trained XGBoost, LightGBM or linear model
+        filepath: Path to save the compiled model (.npz)
+        scaler: StandardScaler used in front of a linear model (optional)
+        feature_names: Training column order (default: taken from the model)
+        X_check: Sample rows to compare compiled and original predictions,
+            scored by the API's CompiledModel from the exported file (optional)
+        tolerance: Largest allowed absolute difference on X_check
+        
+    Returns:
+        Metadata of the compiled model
+        
+    Raises:
+        ValueError: If the compiled predictions differ by more than tolerance
+            (nothing is written then)
+    """
+    import json
+    
+    module = type(model).__module__
+    if module.startswith('xgboost'):
+        arrays, meta = compile_xgboost_model(model)
+    elif module.startswith('lightgbm'):
+        arrays, meta = compile_lightgbm_model(model)
+    elif hasattr(model, 'coef_'):
+        arrays, meta = compile_linear_model(model, scaler)
+    else:
+        raise ValueError(f"Cannot compile model of type {type(model).__name__}")
+    
+    if feature_names is not None:
+        meta['feature_names'] = list(feature_names)
+    meta['format_version'] = _compiled_model().COMPILED_FORMAT_VERSION
+    
+    if X_check is not None:
+        # Score the exported file exactly as the API loads it
+        exported = io.BytesIO()
+        np.savez(exported, meta=np.array(json.dumps(meta)), **arrays)
+        exported.seek(0)
+        compiled = _compiled_model().CompiledModel.load(exported)
+        
+        expected = predict_inventory(model, X_check, scaler)
+        max_error = float(np.max(np.abs(compiled.predict(np.asarray(X_check)) - expected)))
+        if max_error > tolerance:
+            raise ValueError(f"Compiled predictions differ by up to {max_error:.2e} (tolerance {tolerance:.0e})")
+        meta['max_abs_error'] = max_error
+    
+    np.savez(filepath, meta=np.array(json.dumps(meta)), **arrays)
+    print(f"Compiled model saved to: {filepath}")
+    return meta
+
+
 def predict_inventory(model: Any,
                      features: pd.DataFrame,
                      scaler: Any = None) -> np.ndarray:
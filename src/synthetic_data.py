@@ -0,0 +1,218 @@
+"""
+Synthetic store-item sales data for benchmarks and capacity planning.
+
+This module contains functions for:
+- Generating Kaggle-shaped sales histories (date, store, item, sales) at any
+  scale, with yearly and weekly seasonality, trend and promotions
+- Writing them straight to the columnar bundle the API memory-maps
+
+Every store's block of series is drawn from its own seeded generator, so
+the output depends only on the parameters, not on how it is produced, and
+a block is generated in a few vectorized calls with no per-row Python.
+"""
+
+import importlib.util
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator
+import numpy as np
+import pandas as pd
+
+
+# Relative demand Monday..Sunday
+WEEKDAY_PROFILE = np.array([0.86, 0.98, 0.99, 1.03, 1.07, 1.13, 1.19])
+
+# Column dtypes and bundle version of the API's columnar store. Loaded from
+# its file rather than imported, like the feature spec in data_processing
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / 'backend' / 'app' / 'models' / 'schema.py'
+_schema_module = None
+
+
+def _schema():
+    """The API's schema module, loaded once"""
+    global _schema_module
+    if _schema_module is None:
+        spec = importlib.util.spec_from_file_location('schema', SCHEMA_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _schema_module = module
+    return _schema_module
+
+
+def _sales_blocks(n_stores: int,
+                  n_items: int,
+                  start_date: str,
+                  years: int,
+                  seed: int,
+                  seasonality: float,
+                  trend: float,
+                  promotion_rate: float,
+                  promotion_lift: float) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Yield one store's series at a time, sorted by (item, day).
+    
+    Expected sales are store level x item level x yearly season x weekday
+    profile x yearly trend, raised by promotion_lift on promotion days.
+    Sales are Poisson draws around that.
+    """
+    start = pd.Timestamp(start_date)
+    dates = pd.date_range(start, start + pd.DateOffset(years=years), freq='D', inclusive='left')
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    elapsed_years = (days - days[0]) / 365.25
+    
+    rng = np.random.default_rng(seed)
+    store_levels = rng.uniform(0.6, 1.4, n_stores)
+    item_levels = rng.lognormal(np.log(30), 0.6, n_items)
+    item_phases = rng.normal(0, 0.3, n_items)  # Items peak at slightly different times of year
+    
+    # (items, days) demand profile shared by every store
+    yearly = 1 + seasonality * np.sin(
+        2 * np.pi * (dates.dayofyear.to_numpy() - 80) / 365.25 + item_phases[:, None]
+    )
+    profile = (
+        item_levels[:, None] * yearly
+        * WEEKDAY_PROFILE[dates.dayofweek.to_numpy()]
+        * (1 + trend) ** elapsed_years
+    )
+    
+    for store in range(n_stores):
+        store_rng = np.random.default_rng([seed, store])
+        promotion = store_rng.random(profile.shape) < promotion_rate
+        expected = store_levels[store] * profile * np.where(promotion, 1 + promotion_lift, 1.0)
+        yield {
+            'store': np.full(profile.size, store + 1),
+            'item': np.repeat(np.arange(1, n_items + 1), len(days)),
+            'day': np.tile(days, n_items),
+            'sales': store_rng.poisson(expected).ravel(),
+            'promotion': promotion.ravel(),
+        }
+
+
+def generate_sales_data(n_stores: int = 10,
+                        n_items: int = 50,
+                        start_date: str = '2013-01-01',
+                        years: int = 5,
+                        seed: int = 42,
+                        seasonality: float = 0.25,
+                        trend: float = 0.05,
+                        promotion_rate: float = 0.05,
+                        promotion_lift: float = 0.3) -> pd.DataFrame:
+    """
+    Generate a synthetic store-item sales history.
+    
+    The defaults match the shape of the Kaggle data the models are trained
+    on (10 stores, 50 items, 5 years).
+    
+    Args:
+        n_stores: Number of stores (ids 1..n_stores)
+        n_items: Number of items (ids 1..n_items)
+        start_date: First date
+        years: Number of years of daily history
+        seed: Random seed
+        seasonality: Amplitude of the yearly cycle (fraction of demand)
+        trend: Yearly demand growth (fraction)
+        promotion_rate: Probability a series is on promotion on a day
+        promotion_lift: Demand increase on promotion days (fraction)
+    
+    Returns:
+        DataFrame with date, store, item, sales and promotion columns,
+        sorted by (store, item, date)
+    """
+    blocks = list(_sales_blocks(n_stores, n_items, start_date, years, seed,
+                                seasonality, trend, promotion_rate, promotion_lift))
+    columns = {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+    return pd.DataFrame({
+        'date': columns['day'].astype('datetime64[D]').astype('datetime64[ns]'),
+        'store': columns['store'],
+        'item': columns['item'],
+        'sales': columns['sales'],
+        'promotion': columns['promotion'].astype(int),
+    })
+
+
+def write_sales_columnar(out_dir: str,
+                         n_stores: int = 10,
+                         n_items: int = 50,
+                         start_date: str = '2013-01-01',
+                         years: int = 5,
+                         seed: int = 42,
+                         seasonality: float = 0.25,
+                         trend: float = 0.05,
+                         promotion_rate: float = 0.05,
+                         promotion_lift: float = 0.3) -> int:
+    """
+    Generate a synthetic sales history straight into a columnar bundle.
+    
+    The bundle has the layout of backend/app/models/columnar_store.py: one
+    .npy file per column (store, item, day, sales, plus promotion), sorted
+    by (store, item, day), and meta.json. The API can serve it by pointing
+    DATA_PATH at the directory. Store and item ids use int8 when they fit,
+    as in the Kaggle bundle, and wider integers otherwise. Columns are
+    written store by store into memory-mapped files, so memory stays at one
+    store's block.
+    
+    Args:
+        out_dir: Bundle directory (replaced if it exists)
+        (other arguments as in generate_sales_data)
+    
+    Returns:
+        Number of records written
+    
+    Raises:
+        ValueError: If a sales value does not fit the int16 sales column
+    """
+    n_days = len(pd.date_range(pd.Timestamp(start_date),
+                               pd.Timestamp(start_date) + pd.DateOffset(years=years),
+                               freq='D', inclusive='left'))
+    block_size = n_items * n_days
+    records = n_stores * block_size
+    schema = _schema()
+    dtypes = {
+        'store': schema.narrowest_integer_dtype(np.array([n_stores])),
+        'item': schema.narrowest_integer_dtype(np.array([n_items])),
+        'day': np.dtype(schema.SALES_SCHEMA['day']),
+        'sales': np.dtype(schema.SALES_SCHEMA['sales']),
+        'promotion': np.dtype(np.int8),
+    }
+    
+    # Write next to the target and rename, so readers never see a partial bundle
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    
+    files = {
+        name: np.lib.format.open_memmap(tmp_dir / f"{name}.npy", mode='w+', dtype=dtype, shape=(records,))
+        for name, dtype in dtypes.items()
+    }
+    blocks = _sales_blocks(n_stores, n_items, start_date, years, seed,
+                           seasonality, trend, promotion_rate, promotion_lift)
+    for store, block in enumerate(blocks):
+        if block['sales'].max() > np.iinfo(dtypes['sales']).max:
+            raise ValueError(f"Sales of store {store + 1} do not fit in {dtypes['sales']}")
+        rows = slice(store * block_size, (store + 1) * block_size)
+        for name, values in block.items():
+            files[name][rows] = values
+    for values in files.values():
+        values.flush()
+    del files
+    
+    meta = {
+        'format_version': schema.COLUMNAR_FORMAT_VERSION,
+        'records': int(records),
+        'columns': {name: dtype.name for name, dtype in dtypes.items()},
+        'sorted_by': ['store', 'item', 'day'],
+        'source': 'synthetic',
+        'parameters': {
+            'n_stores': n_stores, 'n_items': n_items, 'start_date': start_date, 'years': years,
+            'seed': seed, 'seasonality': seasonality, 'trend': trend,
+            'promotion_rate': promotion_rate, 'promotion_lift': promotion_lift,
+        },
+    }
+    (tmp_dir / 'meta.json').write_text(json.dumps(meta, indent=2))
+    
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp_dir.rename(out_dir)
+    print(f"Synthetic data written to {out_dir}: {records} records")
+    return records